@@ -1,5 +1,8 @@
 
 from .automation_watcher import AutomationWatcher
+from .coverage_map import CoverageMap
+from .crop_map import CropMap
+from .detection_log import DetectionRecorder, DetectionReplay
 from .entity_locator import EntityLocator
 from .field import Field, Row, RowSupportPoint
 from .field_provider import FieldProvider
@@ -9,9 +12,14 @@ from .plant import Plant
 from .plant_locator import PlantLocator
 from .plant_provider import PlantProvider
 from .puncher import Puncher
+from .readiness import Readiness, ReadinessGate
 
 __all__ = [
     'AutomationWatcher',
+    'CoverageMap',
+    'CropMap',
+    'DetectionRecorder',
+    'DetectionReplay',
     'EntityLocator',
     'Field',
     'FieldProvider',
@@ -21,6 +29,8 @@ __all__ = [
     'PlantLocator',
     'PlantProvider',
     'Puncher',
+    'Readiness',
+    'ReadinessGate',
     'Row',
     'RowSupportPoint',
 ]
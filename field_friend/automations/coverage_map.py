@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from rosys.event import Event
+from rosys.geometry import GeoReference, Point
+
+from .field_provider import FieldProvider
+
+COVERAGE_MAP_PATH = Path('~/.rosys/coverage_maps').expanduser()
+CELL_SIZE = 0.01
+CHUNK_CELLS = 128
+
+Chunk = tuple[int, int]
+
+
+@dataclass(slots=True, kw_only=True)
+class CoverageChange:
+    treated_area: float
+    """Area which has been treated for the first time."""
+    double_treated_area: float
+    """Area which has been treated for the second time."""
+
+
+class CoverageMap:
+    """Raster of the ground treated by punches and sprays.
+
+    Each cell counts how often it has been treated.
+    The raster is split into square chunks which are stored per field as NumPy files and loaded on first access.
+    Cells are in the local frame of the field's geo reference, so the statistics stay in place across restarts.
+    Without a selected field or without a path the map is kept in memory only.
+
+    Whether a point is treated only refers to the current run, which is started with ``start_run``,
+    so weeds which grow on ground treated by earlier runs are targeted again.
+    """
+
+    def __init__(self, field_provider: FieldProvider, *, path: Path | None = COVERAGE_MAP_PATH) -> None:
+        self.TREATED: Event[CoverageChange] = Event()
+        """A footprint has been recorded (argument: the change of the treated area)."""
+
+        self.log = logging.getLogger('field_friend.coverage_map')
+        self.field_provider = field_provider
+        self.path = path
+        self.field_id: str | None = None
+        self._chunks: dict[Chunk, np.ndarray] = {}
+        self._dirty: set[Chunk] = set()
+        self._run_chunks: dict[Chunk, np.ndarray] = {}
+        field_provider.FIELD_SELECTED.register(self._handle_field_selected)
+        self._handle_field_selected()
+
+    @property
+    def field_path(self) -> Path | None:
+        if self.path is None or self.field_id is None:
+            return None
+        return self.path / self.field_id
+
+    def record(self, center: Point, radius: float, *, inner_radius: float = 0.0) -> CoverageChange:
+        """Mark the cells whose centers lie between ``inner_radius`` and ``radius`` around ``center`` as treated."""
+        return self.record_strip(center, center, radius, inner_radius=inner_radius)
+
+    def record_strip(self, start: Point, end: Point, radius: float, *, inner_radius: float = 0.0) -> CoverageChange:
+        """Mark the cells whose centers lie between ``inner_radius`` and ``radius`` around the line from ``start`` to ``end``."""
+        i_min, j_min = _cell(min(start.x, end.x) - radius, min(start.y, end.y) - radius)
+        i_max, j_max = _cell(max(start.x, end.x) + radius, max(start.y, end.y) + radius)
+        i, j = np.meshgrid(np.arange(i_min, i_max + 1), np.arange(j_min, j_max + 1), indexing='ij')
+        centers = np.column_stack(((i.ravel() + 0.5) * CELL_SIZE, (j.ravel() + 0.5) * CELL_SIZE))
+        distances = distances_to_segment(centers, start, end).reshape(i.shape)
+        is_inside = (distances >= inner_radius) & (distances <= radius)
+        new_cells = 0
+        double_cells = 0
+        for chunk, rows, cols in _split(i[is_inside], j[is_inside]):
+            data = self._chunk(chunk, create=True)
+            assert data is not None
+            counts = data[rows, cols]
+            new_cells += int(np.count_nonzero(counts == 0))
+            double_cells += int(np.count_nonzero(counts == 1))
+            data[rows, cols] = np.minimum(counts.astype(np.uint16) + 1, 255)
+            self._dirty.add(chunk)
+            self._run_chunks.setdefault(chunk, np.zeros((CHUNK_CELLS, CHUNK_CELLS), dtype=bool))[rows, cols] = True
+        change = CoverageChange(treated_area=new_cells * CELL_SIZE**2, double_treated_area=double_cells * CELL_SIZE**2)
+        self.TREATED.emit(change)
+        return change
+
+    def start_run(self) -> None:
+        """Start a new run, so that the ground treated so far counts as untreated again."""
+        self._run_chunks.clear()
+
+    def is_treated(self, point: Point) -> bool:
+        """Check if the point has been treated in the current run."""
+        i, j = _cell(point.x, point.y)
+        data = self._run_chunks.get((i // CHUNK_CELLS, j // CHUNK_CELLS))
+        return data is not None and bool(data[i % CHUNK_CELLS, j % CHUNK_CELLS])
+
+    def are_treated(self, points: np.ndarray) -> np.ndarray:
+        """Vectorized version of ``is_treated`` for an array of x and y coordinates with shape (n, 2)."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        i = np.floor(points[:, 0] / CELL_SIZE).astype(np.int64)
+        j = np.floor(points[:, 1] / CELL_SIZE).astype(np.int64)
+        result = np.zeros(len(points), dtype=bool)
+        for chunk, rows, cols in _split(i, j):
+            data = self._run_chunks.get(chunk)
+            if data is not None:
+                is_in_chunk = (i // CHUNK_CELLS == chunk[0]) & (j // CHUNK_CELLS == chunk[1])
+                result[is_in_chunk] = data[rows, cols]
+        return result
+
+    def statistics(self) -> CoverageChange:
+        """Treated and double-treated area of the whole map."""
+        self._load_all()
+        treated = sum(int(np.count_nonzero(data)) for data in self._chunks.values())
+        double_treated = sum(int(np.count_nonzero(data > 1)) for data in self._chunks.values())
+        return CoverageChange(treated_area=treated * CELL_SIZE**2, double_treated_area=double_treated * CELL_SIZE**2)
+
+    def save(self) -> None:
+        field_path = self.field_path
+        if field_path is None or not self._dirty:
+            return
+        field_path.mkdir(parents=True, exist_ok=True)
+        reference_path = field_path / 'reference.json'
+        if not reference_path.exists() and GeoReference.current is not None:
+            origin = GeoReference.current.origin
+            reference_path.write_text(json.dumps({'lat': origin.lat, 'lon': origin.lon}))
+        for chunk in self._dirty:
+            chunk_path = self._chunk_path(chunk)
+            assert chunk_path is not None
+            tmp_path = chunk_path.with_suffix('.tmp.npy')
+            np.save(tmp_path, self._chunks[chunk])
+            os.replace(tmp_path, chunk_path)
+        self.log.debug('Saved %s chunks of field %s', len(self._dirty), self.field_id)
+        self._dirty.clear()
+
+    def clear(self) -> None:
+        """Forget all treatments of the current field, including the stored ones."""
+        self._chunks.clear()
+        self._dirty.clear()
+        self._run_chunks.clear()
+        field_path = self.field_path
+        if field_path is not None:
+            for chunk_path in field_path.glob('*.npy'):
+                chunk_path.unlink()
+            (field_path / 'reference.json').unlink(missing_ok=True)
+
+    def _handle_field_selected(self) -> None:
+        selected_field = self.field_provider.selected_field
+        field_id = selected_field.id if selected_field else None
+        if field_id == self.field_id:
+            return
+        self.save()
+        self.field_id = field_id
+        self._chunks.clear()
+        self._dirty.clear()
+        self._run_chunks.clear()
+        self._check_reference()
+
+    def _check_reference(self) -> None:
+        field_path = self.field_path
+        if field_path is None or GeoReference.current is None:
+            return
+        reference_path = field_path / 'reference.json'
+        if not reference_path.exists():
+            return
+        origin = json.loads(reference_path.read_text())
+        if abs(origin['lat'] - GeoReference.current.origin.lat) > 1e-9 or \
+                abs(origin['lon'] - GeoReference.current.origin.lon) > 1e-9:
+            self.log.warning('Geo reference of field %s has changed, discarding its coverage map', self.field_id)
+            self.clear()
+
+    def _chunk_path(self, chunk: Chunk) -> Path | None:
+        field_path = self.field_path
+        return None if field_path is None else field_path / f'{chunk[0]}_{chunk[1]}.npy'
+
+    def _chunk(self, chunk: Chunk, *, create: bool = False) -> np.ndarray | None:
+        if chunk in self._chunks:
+            return self._chunks[chunk]
+        chunk_path = self._chunk_path(chunk)
+        if chunk_path is not None and chunk_path.exists():
+            self._chunks[chunk] = np.load(chunk_path)
+        elif create:
+            self._chunks[chunk] = np.zeros((CHUNK_CELLS, CHUNK_CELLS), dtype=np.uint8)
+        return self._chunks.get(chunk)
+
+    def _load_all(self) -> None:
+        field_path = self.field_path
+        if field_path is None or not field_path.exists():
+            return
+        for chunk_path in field_path.glob('*_*.npy'):
+            if chunk_path.name.endswith('.tmp.npy'):
+                continue
+            ci, cj = chunk_path.stem.split('_')
+            self._chunk((int(ci), int(cj)))
+
+
+def distances_to_segment(points: np.ndarray, start: Point, end: Point) -> np.ndarray:
+    """Distances of an array of x and y coordinates with shape (n, 2) to the line segment from ``start`` to ``end``."""
+    a = np.array([start.x, start.y])
+    ab = np.array([end.x - start.x, end.y - start.y])
+    length_squared = float(ab @ ab)
+    t = np.zeros(len(points)) if length_squared == 0 else np.clip((points - a) @ ab / length_squared, 0, 1)
+    return np.linalg.norm(points - (a + np.outer(t, ab)), axis=1)
+
+
+def _cell(x: float, y: float) -> tuple[int, int]:
+    return int(np.floor(x / CELL_SIZE)), int(np.floor(y / CELL_SIZE))
+
+
+def _split(i: np.ndarray, j: np.ndarray) -> list[tuple[Chunk, np.ndarray, np.ndarray]]:
+    """Group cell indices by chunk and return the row and column indices within each chunk."""
+    chunk_i = i // CHUNK_CELLS
+    chunk_j = j // CHUNK_CELLS
+    groups = []
+    for ci, cj in set(zip(chunk_i.tolist(), chunk_j.tolist(), strict=True)):
+        is_in_chunk = (chunk_i == ci) & (chunk_j == cj)
+        groups.append(((ci, cj), i[is_in_chunk] % CHUNK_CELLS, j[is_in_chunk] % CHUNK_CELLS))
+    return groups
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import rosys
+from rosys.geometry import GeoPoint, Point, Point3d
+
+from .field import Field, Row
+from .plant import Plant
+from .plant_provider import PlantProvider
+
+CROP_MAP_PATH = Path('~/.rosys/crop_maps').expanduser()
+PRIOR_CONFIDENCE = 0.3  # see PlantLocator.MINIMUM_CROP_CONFIDENCE
+CROP_DTYPE = np.dtype([('lat', 'f8'), ('lon', 'f8'), ('confidence', 'f4'), ('type', 'U32')])
+
+
+class CropMap:
+    """Map of confirmed crops per field which survives restarts.
+
+    Each row is stored as a NumPy file of geo coordinates in the field's directory.
+    It is memory-mapped and added to the plant provider only when the robot enters the row.
+    Known crops are loaded as priors with the confidence of a single weak detection where no crop is tracked yet.
+    They help matching on the next pass but have to be detected again before any implement acts on them.
+    """
+
+    def __init__(self, plant_provider: PlantProvider, *, path: Path = CROP_MAP_PATH) -> None:
+        self.log = logging.getLogger('field_friend.crop_map')
+        self.plant_provider = plant_provider
+        self.path = path
+
+    def row_path(self, field: Field, row: Row) -> Path:
+        return self.path / field.id / f'{row.id}.npy'
+
+    def load_row(self, field: Field, row: Row) -> list[Plant]:
+        """Add the stored crops of the row which are not tracked yet to the plant provider and return them."""
+        row_path = self.row_path(field, row)
+        if not row_path.exists():
+            return []
+        entries = np.load(row_path, mmap_mode='r')
+        crops: list[Plant] = []
+        for lat, lon, confidence, crop_type in entries.tolist():
+            point = GeoPoint(lat=lat, lon=lon).to_local()
+            crop = Plant(type=crop_type, detection_time=rosys.time())
+            crop.add_observation(Point3d(x=point.x, y=point.y, z=0), min(confidence, PRIOR_CONFIDENCE))
+            crops.append(crop)
+        priors = self.plant_provider.add_crop_priors(crops)
+        self.log.debug('Loaded %s of %s crops of %s', len(priors), len(crops), row.name)
+        return priors
+
+    def save_row(self, field: Field, row: Row) -> None:
+        """Store the confirmed crops along the row, replacing what was stored before."""
+        start = row.points[0].to_local()
+        end = row.points[-1].to_local()
+        crops = [crop for crop in self.plant_provider.get_relevant_crops(Point3d(x=(start.x + end.x) / 2,
+                                                                                 y=(start.y + end.y) / 2, z=0),
+                                                                         max_distance=start.distance(end) / 2 + field.row_spacing)
+                 if _distance_to_line(crop.position.projection(), start, end) < field.row_spacing / 2]
+        if not crops:
+            return
+        entries = np.empty(len(crops), dtype=CROP_DTYPE)
+        for i, crop in enumerate(crops):
+            geo_point = GeoPoint.from_point(crop.position.projection())
+            entries[i] = (geo_point.lat, geo_point.lon, crop.confidence, crop.type)
+        row_path = self.row_path(field, row)
+        row_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = row_path.with_suffix('.tmp.npy')
+        np.save(tmp_path, entries)
+        os.replace(tmp_path, row_path)
+        self.log.debug('Saved %s crops of %s', len(crops), row.name)
+
+    def clear_field(self, field: Field) -> None:
+        shutil.rmtree(self.path / field.id, ignore_errors=True)
+
+
+def _distance_to_line(point: Point, start: Point, end: Point) -> float:
+    length = start.distance(end)
+    if length == 0:
+        return point.distance(start)
+    return abs((end.x - start.x) * (start.y - point.y) - (start.x - point.x) * (end.y - start.y)) / length
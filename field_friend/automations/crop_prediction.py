@@ -0,0 +1,34 @@
+import numpy as np
+from rosys.geometry import Point
+
+MIN_CROPS = 3
+MIN_PHASE_CONSISTENCY = 0.8
+
+
+def predict_crop_positions(crop_positions: list[Point], row_start: Point, row_end: Point, spacing: float, *,
+                           start: float, end: float) -> list[Point]:
+    """Predict the crop positions along a row from confirmed crops and the known crop spacing.
+
+    The confirmed crops determine the phase of the regular crop pattern along the row and its lateral offset.
+    Predictions are returned for all slots between ``start`` and ``end`` (distances along the row from ``row_start``).
+    Returns an empty list if there are too few confirmed crops or they do not follow the crop spacing.
+    """
+    if len(crop_positions) < MIN_CROPS or spacing <= 0 or row_start.distance(row_end) == 0:
+        return []
+    origin = np.array([row_start.x, row_start.y])
+    direction = np.array([row_end.x - row_start.x, row_end.y - row_start.y]) / row_start.distance(row_end)
+    normal = np.array([-direction[1], direction[0]])
+    offsets = np.array([(p.x, p.y) for p in crop_positions]) - origin
+    along = offsets @ direction
+    lateral = offsets @ normal
+    phases = np.exp(2j * np.pi * along / spacing)
+    mean_phase = phases.mean()
+    if abs(mean_phase) < MIN_PHASE_CONSISTENCY:
+        return []
+    phase = np.angle(mean_phase) / (2 * np.pi) * spacing
+    lateral_offset = float(np.median(lateral))
+    first_slot = int(np.ceil((start - phase) / spacing))
+    last_slot = int(np.floor((end - phase) / spacing))
+    slots = phase + spacing * np.arange(first_slot, last_slot + 1)
+    positions = origin + np.outer(slots, direction) + lateral_offset * normal
+    return [Point(x=x, y=y) for x, y in positions.tolist()]
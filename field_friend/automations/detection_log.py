@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import json
+import logging
+import struct
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, cast
+
+import rosys
+from nicegui import ui
+from rosys.geometry import Point, Pose
+
+from .coverage_map import CoverageMap
+from .implements import WeedingImplement
+from .plant_locator import PendingDetection
+from .plant_provider import PlantChanges, PlantProvider
+
+if TYPE_CHECKING:
+    from ..system import System
+
+DETECTION_LOG_PATH = Path('~/.rosys/detection_logs').expanduser()
+MAGIC = b'FFDLOG1\n'
+RECORD_HEADER = struct.Struct('<cI')
+FRAME = struct.Struct('<8dHI')
+DETECTION = struct.Struct('<3fH')
+
+
+@dataclass(slots=True, kw_only=True)
+class LoggedCalibration:
+    camera_id: str
+    width: int
+    height: int
+    calibration: dict
+
+
+@dataclass(slots=True, kw_only=True)
+class LoggedDetection:
+    category_name: str
+    cx: float
+    cy: float
+    confidence: float
+
+
+@dataclass(slots=True, kw_only=True)
+class LoggedFrame:
+    camera_id: str
+    image_time: float
+    time: float
+    capture_pose: Pose
+    pose: Pose
+    detections: list[LoggedDetection]
+
+
+class DetectionLogWriter:
+    """Writes calibrations and detection frames to a compact binary log.
+
+    Each record is a type byte and a payload length followed by the payload.
+    Strings like camera ids and category names are written once and referenced by index afterwards.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._strings: dict[str, int] = {}
+        self._file.write(MAGIC)
+
+    def write_calibration(self, calibration: LoggedCalibration) -> None:
+        self._write(b'C', json.dumps(asdict(calibration)).encode())
+
+    def write_frame(self, frame: LoggedFrame) -> None:
+        payload = FRAME.pack(frame.image_time, frame.time,
+                             frame.capture_pose.x, frame.capture_pose.y, frame.capture_pose.yaw,
+                             frame.pose.x, frame.pose.y, frame.pose.yaw,
+                             self._string_index(frame.camera_id), len(frame.detections))
+        payload += b''.join(DETECTION.pack(d.cx, d.cy, d.confidence, self._string_index(d.category_name))
+                            for d in frame.detections)
+        self._write(b'F', payload)
+
+    def _string_index(self, text: str) -> int:
+        if text not in self._strings:
+            self._strings[text] = len(self._strings)
+            self._write(b'S', text.encode())
+        return self._strings[text]
+
+    def _write(self, record_type: bytes, payload: bytes) -> None:
+        self._file.write(RECORD_HEADER.pack(record_type, len(payload)))
+        self._file.write(payload)
+
+
+def read_detection_log(path: Path) -> Iterator[LoggedCalibration | LoggedFrame]:
+    with path.open('rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a detection log')
+        strings: list[str] = []
+        while header := file.read(RECORD_HEADER.size):
+            record_type, length = RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if record_type == b'S':
+                strings.append(payload.decode())
+            elif record_type == b'C':
+                yield LoggedCalibration(**json.loads(payload))
+            elif record_type == b'F':
+                image_time, t, capture_x, capture_y, capture_yaw, x, y, yaw, camera_index, count = \
+                    FRAME.unpack_from(payload)
+                detections = [LoggedDetection(category_name=strings[category_index], cx=cx, cy=cy, confidence=confidence)
+                              for cx, cy, confidence, category_index in DETECTION.iter_unpack(payload[FRAME.size:])]
+                assert len(detections) == count
+                yield LoggedFrame(camera_id=strings[camera_index], image_time=image_time, time=t,
+                                  capture_pose=Pose(x=capture_x, y=capture_y, yaw=capture_yaw),
+                                  pose=Pose(x=x, y=y, yaw=yaw),
+                                  detections=detections)
+
+
+class DetectionRecorder:
+    """Records the detections handled by the plant locator together with calibrations and robot poses."""
+
+    def __init__(self, system: System) -> None:
+        self.log = logging.getLogger('field_friend.detection_recorder')
+        self.robot_locator = system.robot_locator
+        self.path: Path | None = None
+        self._file: BinaryIO | None = None
+        self._writer: DetectionLogWriter | None = None
+        self._recorded_cameras: set[str] = set()
+        system.plant_locator.NEW_DETECTIONS.register(self._record)
+
+    @property
+    def is_recording(self) -> bool:
+        return self._writer is not None
+
+    def start(self, path: Path | None = None) -> None:
+        self.stop()
+        self.path = path or DETECTION_LOG_PATH / f'{datetime.now():%Y-%m-%d_%H-%M-%S}.ffdlog'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open('wb')
+        self._writer = DetectionLogWriter(self._file)
+        self._recorded_cameras.clear()
+        self.log.info('Recording detections to %s', self.path)
+
+    def stop(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._writer = None
+
+    def _record(self, detection: PendingDetection) -> None:
+        if self._writer is None or detection.image.detections is None:
+            return
+        camera = detection.camera
+        if camera.id not in self._recorded_cameras and camera.calibration is not None:
+            self._writer.write_calibration(LoggedCalibration(camera_id=camera.id,
+                                                             width=detection.image.size.width,
+                                                             height=detection.image.size.height,
+                                                             calibration=rosys.persistence.to_dict(camera.calibration)))
+            self._recorded_cameras.add(camera.id)
+        self._writer.write_frame(LoggedFrame(
+            camera_id=camera.id,
+            image_time=detection.image.time,
+            time=rosys.time(),
+            capture_pose=detection.pose,
+            pose=self.robot_locator.pose,
+            detections=[LoggedDetection(category_name=d.category_name, cx=d.cx, cy=d.cy, confidence=d.confidence)
+                        for d in detection.image.detections.points],
+        ))
+
+    def developer_ui(self) -> None:
+        ui.label('Detection Recorder').classes('text-center text-bold')
+        with ui.row():
+            ui.button('Start', on_click=lambda: self.start()).bind_enabled_from(self, 'is_recording', lambda r: not r)
+            ui.button('Stop', on_click=self.stop).bind_enabled_from(self, 'is_recording')
+        ui.label().bind_text_from(self, 'path', lambda p: str(p) if p else '').classes('text-xs')
+
+
+@dataclass(slots=True, kw_only=True)
+class ReplayReport:
+    frames: int = 0
+    detections: int = 0
+    duration: float = 0.0
+    new_plants: int = 0
+    merged_observations: int = 0
+    targets: list[Point] = field(default_factory=list)
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def observations_per_plant(self) -> float:
+        """Average number of observations per plant; higher means detections are associated more consistently."""
+        return (self.new_plants + self.merged_observations) / self.new_plants if self.new_plants else 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.frames} frames ({self.frames_per_second:.0f} frames/s), {self.detections} detections, '
+                f'{self.new_plants} plants with {self.observations_per_plant:.1f} observations each, '
+                f'{len(self.targets)} targets')
+
+
+@dataclass(slots=True, kw_only=True)
+class _ReplayLocator:
+    pose: Pose = field(default_factory=Pose)
+
+
+class _ReplaySystem:
+    """The live system with its own plant provider, coverage map and robot pose, so that a replay leaves the robot untouched."""
+
+    def __init__(self, system: System) -> None:
+        self._system = system
+        self.plant_provider = PlantProvider()
+        self.coverage_map = CoverageMap(system.field_provider, path=None)
+        self.robot_locator = _ReplayLocator()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._system, name)
+
+
+class DetectionReplay:
+    """Feeds a detection log through the plant locator, a plant provider and the current implement as fast as possible.
+
+    The replay uses its own plant provider, coverage map and implement instance, so the live system is not modified.
+    """
+
+    def __init__(self, system: System) -> None:
+        self.system = system
+        self.replay_system = _ReplaySystem(system)
+        self._implements: dict[type[WeedingImplement], WeedingImplement] = {}
+
+    @property
+    def plant_provider(self) -> PlantProvider:
+        return self.replay_system.plant_provider
+
+    def _implement(self) -> WeedingImplement | None:
+        """A copy of the current weeding implement which works on the replay system."""
+        implement = self.system.current_implement
+        if not isinstance(implement, WeedingImplement):
+            return None
+        implement_type = type(implement)
+        if implement_type not in self._implements:
+            # NOTE: the replay system provides everything the implement needs by delegating to the live system
+            self._implements[implement_type] = implement_type(cast('System', self.replay_system))
+        replay_implement = self._implements[implement_type]
+        replay_implement.restore_from_dict(implement.backup_to_dict())
+        replay_implement.clear()
+        return replay_implement
+
+    async def run(self, path: Path) -> ReplayReport:
+        report = ReplayReport()
+        cameras: dict[str, rosys.vision.CalibratableCamera] = {}
+        implement = self._implement()
+        self.plant_provider.clear()
+
+        def count(changes: PlantChanges) -> None:
+            report.new_plants += len(changes.added_weeds) + len(changes.added_crops)
+            report.merged_observations += len(changes.updated)
+        self.plant_provider.PLANT_CHANGES.register(count)
+        t = time.perf_counter()
+        try:
+            for record in read_detection_log(path):
+                if isinstance(record, LoggedCalibration):
+                    camera = rosys.vision.SimulatedCalibratableCamera(id=record.camera_id,
+                                                                      width=record.width, height=record.height)
+                    camera.calibration = rosys.persistence.from_dict(rosys.vision.Calibration, record.calibration)
+                    cameras[record.camera_id] = camera
+                    continue
+                camera = cameras[record.camera_id]
+                assert camera.calibration is not None
+                image = rosys.vision.Image(camera_id=camera.id, size=camera.calibration.intrinsics.size,
+                                           time=record.image_time)
+                image.detections = rosys.vision.Detections(points=[
+                    rosys.vision.PointDetection(category_name=d.category_name, model_name='replay',
+                                                confidence=d.confidence, x=d.cx, y=d.cy)
+                    for d in record.detections
+                ])
+                self.replay_system.robot_locator.pose = record.pose
+                await self.system.plant_locator.process_detections(camera, image, record.capture_pose,
+                                                                   plant_provider=self.plant_provider)
+                if implement is not None:
+                    target = await implement.get_target()
+                    if target is not None:
+                        report.targets.append(target)
+                report.frames += 1
+                report.detections += len(record.detections)
+        finally:
+            self.plant_provider.PLANT_CHANGES.unregister(count)
+        report.duration = time.perf_counter() - t
+        return report
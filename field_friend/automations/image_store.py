@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import rosys
+
+IMAGE_BYTE_BUDGET = 50 * 1024 * 1024
+
+
+@dataclass(slots=True, kw_only=True)
+class ImageReference:
+    """Lightweight reference to an image in the ``ImageStore`` which does not keep the image alive."""
+    image_id: str
+    camera_id: str
+    time: float
+    thumbnail: bytes | None = None
+
+
+class ImageStore:
+    """LRU cache of detection images which evicts the least recently used images when exceeding its byte budget."""
+
+    def __init__(self, byte_budget: int = IMAGE_BYTE_BUDGET) -> None:
+        self.byte_budget = byte_budget
+        self._images: OrderedDict[str, rosys.vision.Image] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._images
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def add(self, image: rosys.vision.Image) -> ImageReference:
+        if image.id in self._images:
+            self._images.move_to_end(image.id)
+        else:
+            self._images[image.id] = image
+            self._bytes += self._size(image)
+            self._evict()
+        return ImageReference(image_id=image.id, camera_id=image.camera_id, time=image.time)
+
+    def get(self, reference: ImageReference | None) -> rosys.vision.Image | None:
+        if reference is None or reference.image_id not in self._images:
+            return None
+        self._images.move_to_end(reference.image_id)
+        return self._images[reference.image_id]
+
+    def clear(self) -> None:
+        self._images.clear()
+        self._bytes = 0
+
+    def resident_bytes(self, image_ids: set[str]) -> int:
+        """Number of bytes of the stored images with the given ids."""
+        return sum(self._size(image) for image_id, image in self._images.items() if image_id in image_ids)
+
+    def _evict(self) -> None:
+        while self._bytes > self.byte_budget and len(self._images) > 1:
+            _, image = self._images.popitem(last=False)
+            self._bytes -= self._size(image)
+
+    @staticmethod
+    def _size(image: rosys.vision.Image) -> int:
+        return len(image.data or b'')
@@ -24,9 +24,12 @@ class Implement(rosys.persistence.Persistable):
         return None
 
     @track
-    async def activate(self):
-        """Activate the implement (for example to start weeding in a new row)"""
+    async def activate(self) -> bool:
+        """Activate the implement (for example to start weeding in a new row);
+
+        return False if activation failed."""
         self.is_active = True
+        return True
 
     @track
     async def deactivate(self):
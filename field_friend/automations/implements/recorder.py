@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING, Any
 import rosys
 from nicegui import ui
 
+from ..readiness import wait_until_ready
 from .weeding_implement import Implement
 
 if TYPE_CHECKING:
@@ -29,19 +30,19 @@ class Recorder(Implement):
             return False
         return True
 
-    async def activate(self):
-        if self.system.field_friend.flashlight:
-            await self.system.field_friend.flashlight.turn_on()
-        await rosys.sleep(3)  # NOTE: we wait for the camera to adjust
+    async def activate(self) -> bool:
+        await self.system.readiness.turn_on_flashlight()
+        if not await wait_until_ready(self.system.readiness.flashlight, self.system.readiness.camera):
+            rosys.notify('Camera is not ready, aborting', 'negative')
+            return False
         self.system.plant_locator.interval = self.recording_interval
         self.system.plant_locator.resume()
-        await super().activate()
+        return await super().activate()
 
     async def deactivate(self):
         self.system.plant_locator.pause()
         self.system.plant_locator.interval = self.system.plant_locator.INTERVAL
-        if self.system.field_friend.flashlight:
-            await self.system.field_friend.flashlight.turn_off()
+        await self.system.readiness.turn_off_flashlight()
         await super().deactivate()
 
     def backup_to_dict(self) -> dict[str, Any]:
@@ -46,15 +46,22 @@ class Tornado(WeedingImplement):
                 outer_diameter = self.field_friend.tornado_diameters(0)[1]
             inner_radius = inner_diameter / 2
             outer_radius = outer_diameter / 2
-            for weed in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d()):
-                if inner_radius <= weed.position.projection().distance(punch_position) <= outer_radius:
-                    self.system.plant_provider.remove_weed(weed.id)
+            punched_weeds = [weed.id for weed in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d())
+                             if inner_radius <= weed.position.projection().distance(punch_position) <= outer_radius]
+            self.system.plant_provider.remove_weeds(punched_weeds)
+            self.WEEDS_HANDLED.emit(len(punched_weeds))
             if isinstance(self.system.detector, rosys.vision.DetectorSimulation):
                 self.system.detector.simulated_objects = [obj for obj in self.system.detector.simulated_objects
                                                           if not inner_radius <= obj.position.projection().distance(punch_position) <= outer_radius]
         except Exception as e:
             raise ImplementException('Error while tornado Workflow') from e
 
+    def treatment_footprint(self) -> tuple[float, float]:
+        inner_diameter, outer_diameter = self.field_friend.tornado_diameters(self.tornado_angle)
+        if self.drill_with_open_tornado:
+            outer_diameter = self.field_friend.tornado_diameters(0)[1]
+        return inner_diameter / 2, outer_diameter / 2
+
     def has_plants_to_handle(self) -> bool:
         super().has_plants_to_handle()
         if len(self.crops_to_handle) == 0:
@@ -1,13 +1,19 @@
 import logging
 from collections import deque
+from collections.abc import Callable
 from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import rosys
 from nicegui import ui
 from rosys.analysis import track
-from rosys.geometry import Point3d, Pose
+from rosys.event import Event
+from rosys.geometry import Point, Point3d, Pose, Velocity
 
 from ...hardware import Axis, ChainAxis, Sprayer, Tornado
+from ..field import Row
+from ..plant import Plant
+from ..readiness import ReadinessGate, wait_until_ready
 from .implement import Implement
 
 if TYPE_CHECKING:
@@ -19,8 +25,13 @@ class ImplementException(Exception):
 
 
 class WeedingImplement(Implement):
-    FLASHLIGHT_WAIT_TIME = 3.0
-    LOCATOR_WAIT_TIME = 5.0
+    CROP_SAFETY_PASSES = 3
+    DRIVE_WHILE_WEEDING = False
+    MAX_INTERCEPT_SPEED = 0.05
+    MIN_INTERCEPT_SPEED = 0.01
+    PREPOSITION_Y_AXIS = True
+    STANDSTILL_TIMEOUT = 2.0
+    STANDSTILL_VELOCITY = 0.005
 
     def __init__(self,  name: str, system: 'System') -> None:
         super().__init__(name)
@@ -32,6 +43,12 @@ class WeedingImplement(Implement):
         self.cultivated_crop_select: ui.select | None = None
         self.cultivated_crop: str | None = None
         self.crop_safety_distance: float = 0.01
+        self.crop_safety_passes: int = self.CROP_SAFETY_PASSES
+        self.drive_while_weeding: bool = self.DRIVE_WHILE_WEEDING
+        self.max_intercept_speed: float = self.MAX_INTERCEPT_SPEED
+        self.preposition_y_axis: bool = self.PREPOSITION_Y_AXIS
+        self.is_intercepting = False
+        self.is_working = False
 
         # dual mechanism
         self.with_drilling: bool = False
@@ -44,7 +61,14 @@ class WeedingImplement(Implement):
         self.crops_to_handle: dict[str, Point3d] = {}
         self.weeds_to_handle: dict[str, Point3d] = {}
         self.last_punches: deque[Point3d] = deque(maxlen=5)
+        self.punch_cycle_durations: deque[float] = deque(maxlen=100)
         self.next_punch_y_position: float = 0
+        self._plants_to_handle_key: tuple | None = None
+        self._is_standing_still = False
+        system.field_friend.wheels.VELOCITY_MEASURED.register(self._handle_velocity_measurement)
+
+        self.WEEDS_HANDLED: Event[int] = Event()
+        """The implement has finished working at a stop (argument: the number of removed weeds)."""
 
     async def prepare(self) -> bool:
         await super().prepare()
@@ -60,7 +84,10 @@ class WeedingImplement(Implement):
             rosys.notify('hardware is not ready')
             return False
         self.last_punches.clear()
-        await rosys.sleep(2.0)  # NOTE: _check_hardware_ready sometimes returns too early
+        self.system.coverage_map.start_run()
+        if not await wait_until_ready(self.system.readiness.axes):
+            rosys.notify('axes are not ready')
+            return False
         return True
 
     async def finish(self) -> None:
@@ -70,31 +97,39 @@ class WeedingImplement(Implement):
             await self.puncher.clear_view()
         except Exception as e:
             self.log.error(f'Error clearing view: {e}')
+        self.system.coverage_map.save()
         await self.system.timelapse_recorder.compress_video()
         await super().finish()
 
-    async def activate(self):
-        if self.system.field_friend.flashlight:
-            await self.system.field_friend.flashlight.turn_on()
+    async def activate(self) -> bool:
+        await self.system.readiness.turn_on_flashlight()
         await self.puncher.clear_view()
-        await rosys.sleep(self.FLASHLIGHT_WAIT_TIME)
         self.system.plant_locator.resume()
-        await rosys.sleep(self.LOCATOR_WAIT_TIME)
+        if not await wait_until_ready(*self.readiness_gates()):
+            rosys.notify(f'{self.name} is not ready, aborting', 'negative')
+            return False
         assert self.system.camera_provider is not None
         if self.record_video:
             self.system.timelapse_recorder.camera = self.system.camera_provider.first_connected_camera
-        await super().activate()
+        return await super().activate()
 
     async def deactivate(self):
         await super().deactivate()
         self.system.timelapse_recorder.camera = None
-        if self.system.field_friend.flashlight:
-            await self.system.field_friend.flashlight.turn_off()
+        await self.system.readiness.turn_off_flashlight()
         self.system.plant_locator.pause()
 
+    def treatment_footprint(self) -> tuple[float, float]:
+        """Inner and outer radius of the ground treated by a single punch."""
+        return 0.0, self.system.field_friend.DRILL_RADIUS
+
+    def readiness_gates(self) -> list[ReadinessGate]:
+        """Gates which have to be ready before the implement starts working."""
+        return [self.system.readiness.flashlight, self.system.readiness.camera, self.system.plant_locator.readiness]
+
     async def start_workflow(self) -> None:
-        # TODO: only sleep when moving
-        await rosys.sleep(2)  # wait for robot to stand still
+        if not self.is_intercepting:
+            await self.wait_for_standstill()
         if not self.has_plants_to_handle():
             return
         self.log.debug(f'Handling plants with {self.name}...')
@@ -103,6 +138,97 @@ class WeedingImplement(Implement):
         self.log.debug('workflow completed')
         self.crops_to_handle = {}
         self.weeds_to_handle = {}
+        self._plants_to_handle_key = None
+
+    @track
+    async def wait_for_standstill(self) -> bool:
+        """Wait until the wheels report standstill and return whether they did within ``STANDSTILL_TIMEOUT``."""
+        deadline = rosys.time() + self.STANDSTILL_TIMEOUT
+        while not self._is_standing_still:
+            if rosys.time() > deadline:
+                self.log.warning('Robot did not stand still within %.1f s', self.STANDSTILL_TIMEOUT)
+                return False
+            await rosys.sleep(0.01)
+        return True
+
+    async def _wait_while_driving(self, is_reached: Callable[[float], bool]) -> bool:
+        """Wait until ``is_reached`` returns true for the current speed and return whether it did.
+
+        Gives up if the robot stands still for ``STANDSTILL_TIMEOUT``, because then it will not reach the position anymore.
+        """
+        moving_time = rosys.time()
+        while True:
+            velocity = self.system.odometer.current_velocity
+            if is_reached(velocity.linear if velocity is not None else 0.0):
+                return True
+            if not self._is_standing_still:
+                moving_time = rosys.time()
+            elif rosys.time() - moving_time > self.STANDSTILL_TIMEOUT:
+                self.log.warning('Robot stood still for %.1f s before reaching the target', self.STANDSTILL_TIMEOUT)
+                return False
+            await rosys.sleep(0.01)
+
+    def _handle_velocity_measurement(self, velocities: list[Velocity]) -> None:
+        if velocities:
+            self._is_standing_still = abs(velocities[-1].linear) < self.STANDSTILL_VELOCITY and \
+                abs(velocities[-1].angular) < self.STANDSTILL_VELOCITY
+
+    def intercept_lead_time(self) -> float:
+        """Time between starting the workflow and the tool acting on the ground."""
+        return 0.0
+
+    def intercept_preparation_time(self) -> float:
+        """Time needed ahead of reaching the current target to intercept it while driving."""
+        y_axis = self.system.field_friend.y_axis
+        y_travel_time = y_axis.travel_time(self.next_punch_y_position + self.system.field_friend.WORK_Y) \
+            if isinstance(y_axis, Axis) else 0.0
+        return y_travel_time + self.intercept_lead_time()
+
+    @property
+    def average_punch_cycle_duration(self) -> float:
+        """Average time from reaching a target until the workflow is completed."""
+        if not self.punch_cycle_durations:
+            return 0.0
+        return sum(self.punch_cycle_durations) / len(self.punch_cycle_durations)
+
+    @track
+    async def move_y_axis_to_target(self) -> None:
+        """Move the y-axis to the lateral position of the current target so that only the z-stroke remains at the target."""
+        y_axis = self.system.field_friend.y_axis
+        if not isinstance(y_axis, Axis | ChainAxis) or not y_axis.is_referenced:
+            return
+        y = round(self.next_punch_y_position + self.system.field_friend.WORK_Y, 5)
+        if not y_axis.min_position <= y <= y_axis.max_position:
+            return
+        try:
+            await y_axis.move_to(y)
+        except RuntimeError as e:
+            self.log.warning('Could not move y-axis to %.3f: %s', y, e)
+
+    @track
+    async def intercept(self, target: Point) -> None:
+        """Work on the target while the robot drives over it.
+
+        The y-axis is moved to the target right away.
+        The workflow starts as soon as the tool will reach the target within the lead time at the current speed.
+        """
+        self.is_intercepting = True
+        try:
+            await self.move_y_axis_to_target()
+
+            def is_reached(speed: float) -> bool:
+                remaining = self.system.robot_locator.pose.relative_point(target).x - self.system.field_friend.WORK_X
+                return remaining <= speed * self.intercept_lead_time()
+            if not await self._wait_while_driving(is_reached):
+                return
+            self.is_working = True
+            try:
+                await self.start_workflow()
+                await self.stop_workflow()
+            finally:
+                self.is_working = False
+        finally:
+            self.is_intercepting = False
 
     @track
     async def _check_hardware_ready(self) -> bool:
@@ -139,47 +265,99 @@ class WeedingImplement(Implement):
         return True
 
     def has_plants_to_handle(self) -> bool:
-        current_pose = self.system.robot_locator.pose
-        relative_crop_positions = {
-            c.id: Point3d.from_point(current_pose.relative_point(c.position.projection()))
-            for c in self.system.plant_provider.get_relevant_crops(current_pose.point_3d())
-            if self.cultivated_crop is None or c.type == self.cultivated_crop
-        }
-        upcoming_crop_positions = {
-            c: pos for c, pos in relative_crop_positions.items()
-            if self.system.field_friend.WORK_X - self.system.field_friend.DRILL_RADIUS < pos.x < 0.3
-        }
-        # Sort the upcoming positions so nearest comes first
-        sorted_crops = dict(sorted(upcoming_crop_positions.items(), key=lambda item: item[1].x))
-        self.crops_to_handle = sorted_crops
+        self._update_plants_to_handle()
+        return False
 
-        relative_weed_positions = {
-            w.id: Point3d.from_point(current_pose.relative_point(w.position.projection()))
-            for w in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d())
-            if w.type in self.relevant_weeds
-        }
-        upcoming_weed_positions = {
-            w: pos for w, pos in relative_weed_positions.items()
-            if self.system.field_friend.WORK_X - self.system.field_friend.DRILL_RADIUS < pos.x < 0.4
-        }
+    def _update_plants_to_handle(self) -> None:
+        """Update the crops and weeds to handle unless neither the robot pose nor the plants have changed since the last update."""
+        current_pose = self.system.robot_locator.pose
+        row = getattr(self.system.current_navigation, 'current_row', None)
+        key = (current_pose.time, current_pose.x, current_pose.y, current_pose.yaw, self.system.plant_provider.version,
+               row.id if isinstance(row, Row) else None, self.cultivated_crop, tuple(self.relevant_weeds),
+               self.crop_safety_distance, self.crop_safety_passes)
+        if key == self._plants_to_handle_key:
+            return
+        self._plants_to_handle_key = key
+        crops = [c for c in self._get_relevant_crops(current_pose)
+                 if self.cultivated_crop is None or c.type == self.cultivated_crop]
+        crop_ids, crop_positions = self._upcoming_positions(current_pose, crops, max_x=0.3)
+        weeds = [w for w in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d())
+                 if w.type in self.relevant_weeds]
+        weed_ids, weed_positions = self._upcoming_positions(current_pose, weeds, max_x=0.4)
 
         # keep crops safe by pushing weeds away so the implement does not accidentally hit a crop
-        for _, crop_position in sorted_crops.items():
-            for weed, weed_position in upcoming_weed_positions.items():
-                offset = self.system.field_friend.DRILL_RADIUS + \
-                    self.crop_safety_distance - crop_position.distance(weed_position)
-                if offset > 0:
-                    # TODO: check if this is correct
-                    weed_position_2d = weed_position.projection()
-                    crop_position_2d = crop_position.projection()
-                    safe_weed_position_2d = weed_position_2d.polar(offset, crop_position_2d.direction(weed_position_2d))
-                    upcoming_weed_positions[weed] = Point3d.from_point(safe_weed_position_2d)
-                    self.log.debug('corrected weed position: %s -> %s', weed_position_2d, safe_weed_position_2d)
+        safe_weed_positions = self._push_away(weed_positions, crop_positions,
+                                              self.system.field_friend.DRILL_RADIUS + self.crop_safety_distance)
+        corrected = np.flatnonzero((safe_weed_positions != weed_positions).any(axis=1))
+        if len(corrected):
+            self.log.debug('corrected %s weed positions near crops: %s', len(corrected),
+                           ', '.join(f'{weed_ids[i][:8]}: {weed_positions[i]} -> {safe_weed_positions[i]}' for i in corrected))
 
         # Sort the upcoming positions so nearest comes first
-        sorted_weeds = dict(sorted(upcoming_weed_positions.items(), key=lambda item: item[1].x))
-        self.weeds_to_handle = sorted_weeds
-        return False
+        self.crops_to_handle = self._sorted_by_x(crop_ids, crop_positions)
+        self.weeds_to_handle = self._sorted_by_x(weed_ids, safe_weed_positions)
+
+    def _upcoming_positions(self, pose: Pose, plants: list[Plant], *, max_x: float) -> tuple[list[str], np.ndarray]:
+        """Ids and robot-relative positions of the plants between the back of the tool and ``max_x``."""
+        if not plants:
+            return [], np.empty((0, 2))
+        relative = self._to_robot_frame(pose, np.array([(p.position.x, p.position.y) for p in plants]))
+        min_x = self.system.field_friend.WORK_X - self.system.field_friend.DRILL_RADIUS
+        indices = np.flatnonzero((min_x < relative[:, 0]) & (relative[:, 0] < max_x))
+        return [plants[i].id for i in indices], relative[indices]
+
+    @staticmethod
+    def _sorted_by_x(ids: list[str], positions: np.ndarray) -> dict[str, Point3d]:
+        order = np.argsort(positions[:, 0], kind='stable')
+        return {ids[i]: Point3d(x=x, y=y, z=0) for i, (x, y) in zip(order.tolist(), positions[order].tolist(), strict=True)}
+
+    def _push_away(self, positions: np.ndarray, obstacles: np.ndarray, distance: float) -> np.ndarray:
+        """Move all positions which are closer than ``distance`` to an obstacle radially away from it.
+
+        Each pass moves every position away from the obstacle it violates the most.
+        Positions near several obstacles may be pushed into another one, so up to ``crop_safety_passes`` passes are made.
+        """
+        positions = positions.copy()
+        for _ in range(self.crop_safety_passes):
+            if not len(positions) or not len(obstacles):
+                break
+            offsets = positions[:, np.newaxis, :] - obstacles[np.newaxis, :, :]
+            distances = np.linalg.norm(offsets, axis=2)
+            violations = distance - distances
+            nearest = np.argmax(violations, axis=1)
+            rows = np.arange(len(positions))
+            is_too_close = violations[rows, nearest] > 0
+            if not is_too_close.any():
+                break
+            offsets = offsets[rows, nearest][is_too_close]
+            distances = distances[rows, nearest][is_too_close]
+            # NOTE: positions exactly on an obstacle are pushed forward
+            directions = np.where(distances[:, np.newaxis] > 0, offsets / np.maximum(distances, 1e-12)[:, np.newaxis], (1.0, 0.0))
+            positions[is_too_close] = obstacles[nearest[is_too_close]] + directions * distance
+        return positions
+
+    @staticmethod
+    def _to_robot_frame(pose: Pose, points: np.ndarray) -> np.ndarray:
+        """Transform world points of shape (n, 2) into the coordinate frame of the pose."""
+        cos, sin = np.cos(pose.yaw), np.sin(pose.yaw)
+        offsets = points - (pose.x, pose.y)
+        return np.column_stack((cos * offsets[:, 0] + sin * offsets[:, 1], -sin * offsets[:, 0] + cos * offsets[:, 1]))
+
+    @staticmethod
+    def _to_world_frame(pose: Pose, points: np.ndarray) -> np.ndarray:
+        """Transform points of shape (n, 2) in the coordinate frame of the pose into world coordinates."""
+        cos, sin = np.cos(pose.yaw), np.sin(pose.yaw)
+        return np.column_stack((pose.x + cos * points[:, 0] - sin * points[:, 1],
+                                pose.y + sin * points[:, 0] + cos * points[:, 1]))
+
+    def _get_relevant_crops(self, current_pose: Pose) -> list[Plant]:
+        """Get confirmed crops and, if crop positions can be predicted along the current row, the predicted ones."""
+        row = getattr(self.system.current_navigation, 'current_row', None)
+        if isinstance(row, Row):
+            row_start, row_end = row.points[0].to_local(), row.points[-1].to_local()
+        else:
+            row_start, row_end = current_pose.point, current_pose.transform(Point(x=1.0, y=0))
+        return self.system.plant_provider.get_predicted_crops(row_start, row_end, current_pose.point_3d())
 
     def backup_to_dict(self) -> dict[str, Any]:
         return super().backup_to_dict() | {
@@ -188,6 +366,10 @@ class WeedingImplement(Implement):
             'chop_if_no_crops': self.chop_if_no_crops,
             'cultivated_crop': self.cultivated_crop,
             'crop_safety_distance': self.crop_safety_distance,
+            'crop_safety_passes': self.crop_safety_passes,
+            'drive_while_weeding': self.drive_while_weeding,
+            'max_intercept_speed': self.max_intercept_speed,
+            'preposition_y_axis': self.preposition_y_axis,
             'record_video': self.record_video,
             'is_demo': self.puncher.is_demo,
         }
@@ -199,12 +381,17 @@ class WeedingImplement(Implement):
         self.chop_if_no_crops = data.get('chop_if_no_crops', self.chop_if_no_crops)
         self.cultivated_crop = data.get('cultivated_crop', self.cultivated_crop)
         self.crop_safety_distance = data.get('crop_safety_distance', self.crop_safety_distance)
+        self.crop_safety_passes = data.get('crop_safety_passes', self.CROP_SAFETY_PASSES)
+        self.drive_while_weeding = data.get('drive_while_weeding', self.DRIVE_WHILE_WEEDING)
+        self.max_intercept_speed = max(data.get('max_intercept_speed', self.MAX_INTERCEPT_SPEED), self.MIN_INTERCEPT_SPEED)
+        self.preposition_y_axis = data.get('preposition_y_axis', self.PREPOSITION_Y_AXIS)
         self.record_video = data.get('record_video', self.record_video)
         self.puncher.is_demo = data.get('is_demo', self.puncher.is_demo)
 
     def clear(self) -> None:
         self.crops_to_handle = {}
         self.weeds_to_handle = {}
+        self._plants_to_handle_key = None
 
     def settings_ui(self) -> None:
         super().settings_ui()
@@ -226,6 +413,23 @@ class WeedingImplement(Implement):
             .classes('w-24') \
             .bind_value(self, 'crop_safety_distance') \
             .tooltip('Set the crop safety distance for the weeding automation')
+        ui.number('Crop safety passes', step=1, min=1, max=10, format='%d', on_change=self.request_backup) \
+            .props('dense outlined') \
+            .classes('w-24') \
+            .bind_value(self, 'crop_safety_passes', forward=lambda v: max(1, int(v or 1))) \
+            .tooltip(f'Number of passes to push weeds away from several nearby crops (default: {self.CROP_SAFETY_PASSES})')
+        ui.checkbox('Drive while weeding', on_change=self.request_backup) \
+            .bind_value(self, 'drive_while_weeding') \
+            .tooltip('Work on targets without stopping if they can be reached in time')
+        ui.number('Max. weeding speed', step=0.01, min=self.MIN_INTERCEPT_SPEED, max=0.5, format='%.2f', on_change=self.request_backup) \
+            .props('dense outlined suffix=m/s') \
+            .classes('w-24') \
+            .bind_value(self, 'max_intercept_speed') \
+            .bind_visibility_from(self, 'drive_while_weeding') \
+            .tooltip(f'Maximum speed while driving over a target (default: {self.MAX_INTERCEPT_SPEED}m/s)')
+        ui.checkbox('Pre-position y-axis', on_change=self.request_backup) \
+            .bind_value(self, 'preposition_y_axis') \
+            .tooltip('Move the y-axis to the next target while approaching it')
         ui.checkbox('record video', on_change=self.request_backup) \
             .bind_value(self, 'record_video') \
             .tooltip('Set the weeding automation to record video')
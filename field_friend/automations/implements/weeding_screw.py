@@ -3,10 +3,11 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import rosys
 from nicegui import ui
 from rosys.analysis import track
-from rosys.geometry import Point
+from rosys.geometry import Point, Pose
 
 from ...hardware import Axis
 from .weeding_implement import ImplementException, WeedingImplement
@@ -18,6 +19,8 @@ if TYPE_CHECKING:
 class WeedingScrew(WeedingImplement):
     DRILL_DEPTH = 0.14
     MAX_CROP_DISTANCE = 0.0
+    MULTI_TARGET = False
+    MULTI_TARGET_X_TOLERANCE = 0.01
 
     def __init__(self, system: System) -> None:
         super().__init__('Weed Screw', system)
@@ -25,64 +28,103 @@ class WeedingScrew(WeedingImplement):
         self.log.debug('Using relevant weeds: %s', self.relevant_weeds)
         self.drill_depth: float = self.DRILL_DEPTH
         self.max_crop_distance: float = self.MAX_CROP_DISTANCE
+        self.multi_target: bool = self.MULTI_TARGET
+        self.multi_target_x_tolerance: float = self.MULTI_TARGET_X_TOLERANCE
 
     async def start_workflow(self) -> None:
         await super().start_workflow()
         try:
             current_pose = self.system.robot_locator.pose
-            punch_position = current_pose.transform3d(rosys.geometry.Point3d(x=self.system.field_friend.WORK_X,
-                                                                             y=self.next_punch_y_position, z=0))
-            self.last_punches.append(punch_position)
-            await self.system.puncher.punch(y=self.next_punch_y_position, depth=self.drill_depth)
-            self.log.debug(f'removing weeds at screw world position {punch_position} '
+            punch_y_positions = self._punch_y_positions() if self.multi_target else [self.next_punch_y_position]
+            punch_positions: list[rosys.geometry.Point3d] = []
+            for y in punch_y_positions:
+                punch_position = current_pose.transform3d(rosys.geometry.Point3d(x=self.system.field_friend.WORK_X, y=y, z=0))
+                self.last_punches.append(punch_position)
+                await self.system.puncher.punch(y=y, depth=self.drill_depth)
+                punch_positions.append(punch_position)
+            self.log.debug(f'removing weeds at screw world positions {punch_positions} '
                            f'with radius {self.system.field_friend.DRILL_RADIUS}')
-            for weed in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d(), min_confidence=0.0):
-                if weed.position.distance(punch_position) > self.system.field_friend.DRILL_RADIUS:
-                    continue
-                self.system.plant_provider.remove_weed(weed.id)
+            punched_weeds = [weed.id for weed in self.system.plant_provider.get_relevant_weeds(current_pose.point_3d(), min_confidence=0.0)
+                             if any(weed.position.distance(p) <= self.system.field_friend.DRILL_RADIUS for p in punch_positions)]
+            self.system.plant_provider.remove_weeds(punched_weeds)
+            self.WEEDS_HANDLED.emit(len(punched_weeds))
             if isinstance(self.system.detector, rosys.vision.DetectorSimulation):
                 self.system.detector.simulated_objects = [
                     obj for obj in self.system.detector.simulated_objects
-                    if obj.position.projection().distance(punch_position.projection()) > self.system.field_friend.DRILL_RADIUS]
+                    if all(obj.position.projection().distance(p.projection()) > self.system.field_friend.DRILL_RADIUS
+                           for p in punch_positions)]
             # NOTE no weeds to work on at this position -> advance robot
         except Exception as e:
             raise ImplementException(f'Error in Weed Screw Workflow: {e}') from e
 
+    def intercept_lead_time(self) -> float:
+        z_axis = self.system.field_friend.z_axis
+        return z_axis.travel_time(-self.drill_depth) if isinstance(z_axis, Axis) else 0.0
+
+    def _punch_y_positions(self) -> list[float]:
+        """Lateral positions to punch at the current stop in the order with the least y-axis travel.
+
+        Besides the current target these are all selectable weeds within the x-tolerance of the tool.
+        Weeds which are covered by the punch of a previous position are skipped.
+        """
+        work_x = self.system.field_friend.WORK_X
+        _, local_positions, _, is_target = self._select_targets(self.system.robot_locator.pose)
+        is_at_stop = is_target & (np.abs(local_positions[:, 0] - work_x) <= self.multi_target_x_tolerance)
+        positions = np.vstack(([work_x, self.next_punch_y_position], local_positions[is_at_stop, :2]))
+        y_axis = self.system.field_friend.y_axis
+        start_y = y_axis.position - self.system.field_friend.WORK_Y if isinstance(y_axis, Axis) else 0.0
+        order = np.argsort(positions[:, 1], kind='stable')
+        if abs(start_y - positions[order[-1], 1]) < abs(start_y - positions[order[0], 1]):
+            order = order[::-1]
+        punch_y_positions: list[float] = []
+        for x, y in positions[order].tolist():
+            if all(np.hypot(x - work_x, y - punch_y) > self.system.field_friend.DRILL_RADIUS for punch_y in punch_y_positions):
+                punch_y_positions.append(y)
+        return punch_y_positions
+
+    def _select_targets(self, current_pose: Pose) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Check which of the weeds to handle can be targeted.
+
+        Returns the weed ids, their local and world positions and a mask of the weeds which can be targeted.
+        """
+        field_friend = self.system.field_friend
+        weed_ids = list(self.weeds_to_handle)
+        local_positions = np.array([(p.x, p.y, p.z) for p in self.weeds_to_handle.values()]).reshape(-1, 3)
+        min_y, max_y = field_friend.reachable_y_range()
+        is_in_range = (min_y <= local_positions[:, 1] + field_friend.WORK_Y) & \
+            (local_positions[:, 1] + field_friend.WORK_Y <= max_y)
+        world_positions = np.column_stack((self._to_world_frame(current_pose, local_positions[:, :2]),
+                                           local_positions[:, 2]))
+        is_near_crop = np.ones(len(weed_ids), dtype=bool)
+        if self.cultivated_crop and self.max_crop_distance > 0:
+            crops = self.system.plant_provider.get_relevant_crops(current_pose.point_3d())
+            crop_positions = np.array([(c.position.x, c.position.y, c.position.z) for c in crops]).reshape(-1, 3)
+            is_near_crop = _is_within(world_positions, crop_positions, self.max_crop_distance)
+        is_punched = self.system.coverage_map.are_treated(world_positions[:, :2])
+        relative_x = local_positions[:, 0] - field_friend.WORK_X
+        is_ahead = (relative_x >= -field_friend.DRILL_RADIUS) & \
+            (relative_x >= -self.system.driver.parameters.minimum_drive_distance)  # TODO: quickfix for weeds behind the robot
+        self.log.debug('Found %s weeds in range: %s too far from crops, %s already punched, %s behind the robot',
+                       np.count_nonzero(is_in_range), np.count_nonzero(is_in_range & ~is_near_crop),
+                       np.count_nonzero(is_in_range & is_punched), np.count_nonzero(is_in_range & ~is_ahead))
+        return weed_ids, local_positions, world_positions, is_in_range & is_near_crop & ~is_punched & is_ahead
+
     @track
     async def get_target(self) -> Point | None:
         """Return the target position to drive to."""
         self.has_plants_to_handle()
         current_pose = self.system.robot_locator.pose
-        weeds_in_range = {weed_id: position for weed_id, position in self.weeds_to_handle.items()
-                          if self.system.field_friend.can_reach(position.projection())}
-        if not weeds_in_range:
-            self.log.debug('No weeds in range')
+        weed_ids, local_positions, world_positions, is_target = self._select_targets(current_pose)
+        if not is_target.any():
+            self.log.debug('No weeds to target')
             return None
-        self.log.debug('Found %s weeds in range: %s', len(weeds_in_range),
-                       ', '.join(f'{weed_id[:8]}: {(position.x - self.system.field_friend.WORK_X):.6f} m'
-                                 for weed_id, position in weeds_in_range.items()))
-        for next_weed_id, next_weed_position in weeds_in_range.items():
-            weed_world_position = current_pose.transform3d(next_weed_position)
-            crops = self.system.plant_provider.get_relevant_crops(current_pose.point_3d())
-            if self.cultivated_crop and self.max_crop_distance > 0 \
-                    and not any(c.position.distance(weed_world_position) < self.max_crop_distance for c in crops):
-                self.log.debug('Skipping weed because it is to far from the cultivated crops')
-                continue
-            if any(p.distance(weed_world_position) < self.system.field_friend.DRILL_RADIUS for p in self.last_punches):
-                self.log.debug('Skipping weed because it was already punched')
-                continue
-            relative_x = next_weed_position.x - self.system.field_friend.WORK_X
-            if relative_x < - self.system.field_friend.DRILL_RADIUS:
-                self.log.debug('Skipping weed %s. It is behind the robot: %.6f m', next_weed_id[:8], relative_x)
-                continue
-            if relative_x < - self.system.driver.parameters.minimum_drive_distance:  # TODO: quickfix for weeds behind the robot
-                self.log.debug('Skipping weed %s. It is too far behind the robot: %.6f m', next_weed_id[:8], relative_x)
-                continue
-            self.log.debug('Targeting weed %s which is %.6f m away at world: %s, local: %s',
-                           next_weed_id[:8], relative_x, weed_world_position, next_weed_position)
-            self.next_punch_y_position = next_weed_position.y
-            return weed_world_position.projection()
-        return None
+        index = int(np.argmax(is_target))
+        weed_world_position = Point(x=float(world_positions[index, 0]), y=float(world_positions[index, 1]))
+        self.log.debug('Targeting weed %s which is %.6f m away at world: %s, local: %s',
+                       weed_ids[index][:8], local_positions[index, 0] - self.system.field_friend.WORK_X,
+                       weed_world_position, self.weeds_to_handle[weed_ids[index]])
+        self.next_punch_y_position = float(local_positions[index, 1])
+        return weed_world_position
 
     def settings_ui(self):
         super().settings_ui()
@@ -102,14 +144,32 @@ class WeedingScrew(WeedingImplement):
             .bind_value(self, 'max_crop_distance') \
             .bind_visibility_from(self, 'cultivated_crop') \
             .tooltip('Set the maximum distance a weed can be away from a crop to be considered for weeding. Set to 0 to disable.')
+        ui.checkbox('Multiple targets per stop', on_change=self.request_backup) \
+            .bind_value(self, 'multi_target') \
+            .tooltip('Punch all reachable weeds at each stop instead of only the nearest one')
+        ui.number('Target x tolerance', step=0.005, min=0.0, max=0.05, format='%.3f', on_change=self.request_backup) \
+            .props('dense outlined suffix=m') \
+            .classes('w-24') \
+            .bind_value(self, 'multi_target_x_tolerance') \
+            .bind_visibility_from(self, 'multi_target') \
+            .tooltip(f'Maximum distance in driving direction between the tool and additional targets (default: {self.MULTI_TARGET_X_TOLERANCE}m)')
 
     def backup_to_dict(self) -> dict[str, Any]:
         return super().backup_to_dict() | {
             'drill_depth': self.drill_depth,
             'max_crop_distance': self.max_crop_distance,
+            'multi_target': self.multi_target,
+            'multi_target_x_tolerance': self.multi_target_x_tolerance,
         }
 
     def restore_from_dict(self, data: dict[str, Any]) -> None:
         super().restore_from_dict(data)
         self.drill_depth = data.get('drill_depth', self.drill_depth)
         self.max_crop_distance = data.get('max_crop_distance', self.max_crop_distance)
+        self.multi_target = data.get('multi_target', self.MULTI_TARGET)
+        self.multi_target_x_tolerance = data.get('multi_target_x_tolerance', self.MULTI_TARGET_X_TOLERANCE)
+
+
+def _is_within(points: np.ndarray, others: np.ndarray, distance: float) -> np.ndarray:
+    """Check for each point whether any of the other points is closer than the given distance."""
+    return (np.linalg.norm(points[:, np.newaxis, :] - others[np.newaxis, :, :], axis=2) < distance).any(axis=1)
@@ -1,22 +1,59 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import rosys
 from nicegui import ui
 from rosys.analysis import track
-from rosys.geometry import Point
+from rosys.geometry import Point, Point3d, Pose
 
 from ...hardware.sprayer import Sprayer
+from ..coverage_map import distances_to_segment
+from ..readiness import ReadinessGate
 from .weeding_implement import ImplementException, WeedingImplement
 
 if TYPE_CHECKING:
     from ...system import System
 
 
+@dataclass(slots=True, kw_only=True)
+class SprayWindow:
+    start: float
+    """Distance the robot has to drive until the valve opens."""
+    end: float
+    """Distance the robot has to drive until the valve closes."""
+    weed_ids: list[str] = field(default_factory=list)
+
+
+def plan_spray_windows(weeds: dict[str, float], *, radius: float, min_gap: float) -> list[SprayWindow]:
+    """Turn the distances of the weeds ahead of the nozzle into valve windows.
+
+    Each weed is sprayed from ``radius`` before until ``radius`` after the nozzle passes it.
+    Windows which overlap or are separated by at most ``min_gap`` are merged, so the valve does not toggle needlessly.
+    """
+    windows: list[SprayWindow] = []
+    for weed_id, distance in sorted(weeds.items(), key=lambda item: item[1]):
+        start = max(distance - radius, 0.0)
+        end = distance + radius
+        if end <= 0:
+            continue
+        if windows and start - windows[-1].end <= min_gap:
+            windows[-1].end = max(windows[-1].end, end)
+            windows[-1].weed_ids.append(weed_id)
+        else:
+            windows.append(SprayWindow(start=start, end=end, weed_ids=[weed_id]))
+    return windows
+
+
 class WeedingSprayer(WeedingImplement):
     PRESSURE_REACH_TIME = 10.0
     SPRAY_TIME = 0.5
+    DRIVE_WHILE_WEEDING = True
+    MAX_INTERCEPT_SPEED = 0.3
+    VALVE_DELAY = 0.05
+    MIN_VALVE_CLOSED_TIME = 0.2
 
     def __init__(self, system: System) -> None:
         super().__init__('Sprayer', system)
@@ -27,13 +64,22 @@ class WeedingSprayer(WeedingImplement):
 
         self.pressure_reach_time: float = self.PRESSURE_REACH_TIME
         self.spray_time: float = self.SPRAY_TIME
+        self.pressure_readiness = ReadinessGate('sprayer pressure', warmup=self.pressure_reach_time)
 
     async def prepare(self) -> bool:
         assert isinstance(self.system.field_friend.z_axis, Sprayer)
         await self.system.field_friend.z_axis.activate_pump()
-        await rosys.sleep(self.pressure_reach_time)
+        self.system.coverage_map.start_run()
+        self.pressure_readiness.warmup = self.pressure_reach_time
+        self.pressure_readiness.start()
         return True
 
+    def treatment_footprint(self) -> tuple[float, float]:
+        return 0.0, self.sprayer_hardware.spray_radius
+
+    def readiness_gates(self) -> list[ReadinessGate]:
+        return [*super().readiness_gates(), self.pressure_readiness]
+
     async def start_workflow(self) -> None:
         assert isinstance(self.sprayer_hardware, Sprayer)
         await super().start_workflow()
@@ -44,10 +90,11 @@ class WeedingSprayer(WeedingImplement):
             await self.sprayer_hardware.open_valve()
             await rosys.sleep(self.spray_time)
             await self.sprayer_hardware.close_valve()
+            self.system.coverage_map.record(punch_position.projection(), self.sprayer_hardware.spray_radius)
             punched_weeds = [weed.id for weed in self.system.plant_provider.get_relevant_weeds(self.system.robot_locator.pose.point_3d())
                              if weed.position.distance(punch_position) <= self.sprayer_hardware.spray_radius]
-            for weed_id in punched_weeds:
-                self.system.plant_provider.remove_weed(weed_id)
+            self.system.plant_provider.remove_weeds(punched_weeds)
+            self.WEEDS_HANDLED.emit(len(punched_weeds))
             if isinstance(self.system.detector, rosys.vision.DetectorSimulation):
                 self.system.detector.simulated_objects = [
                     obj for obj in self.system.detector.simulated_objects
@@ -56,6 +103,92 @@ class WeedingSprayer(WeedingImplement):
             await self.sprayer_hardware.close_valve()
             raise ImplementException(f'Error in Weed Spray Workflow: {e}') from e
 
+    def intercept_lead_time(self) -> float:
+        # NOTE: start spraying early so that the spray is centered on the target
+        return self.spray_time / 2
+
+    @track
+    async def intercept(self, target: Point) -> None:
+        """Spray all upcoming weeds while driving by opening the valve in windows along the current heading.
+
+        The windows are planned once from the weeds ahead and the intercept speed.
+        Each window is executed by the driven distance, so the valve follows the actual ground speed.
+        """
+        self.has_plants_to_handle()
+        pose = self.system.robot_locator.pose
+        start_pose = Pose(x=pose.x, y=pose.y, yaw=pose.yaw)
+        windows = plan_spray_windows(self._weed_distances(),
+                                     radius=self.sprayer_hardware.spray_radius,
+                                     min_gap=self.max_intercept_speed * self.MIN_VALVE_CLOSED_TIME)
+        if not windows:
+            await super().intercept(target)
+            return
+        self.log.debug('Planned %s spray windows for %s weeds: %s', len(windows),
+                       sum(len(window.weed_ids) for window in windows),
+                       ', '.join(f'{window.start:.3f}-{window.end:.3f} m' for window in windows))
+        self.is_intercepting = True
+        try:
+            for window in windows:
+                if not await self._spray_window(start_pose, window):
+                    break
+        finally:
+            self.is_intercepting = False
+            self.weeds_to_handle = {}
+            self._plants_to_handle_key = None
+
+    def _weed_distances(self) -> dict[str, float]:
+        """Distances the nozzle has to travel to the reachable and untreated weeds ahead."""
+        pose = self.system.robot_locator.pose
+        distances: dict[str, float] = {}
+        for weed_id, position in self.weeds_to_handle.items():
+            if not self.system.field_friend.can_reach(position.projection()):
+                continue
+            if self.system.coverage_map.is_treated(pose.transform(position.projection())):
+                continue
+            distances[weed_id] = position.x - self.system.field_friend.WORK_X
+        return distances
+
+    async def _spray_window(self, start_pose: Pose, window: SprayWindow) -> bool:
+        """Spray the window and return whether the robot has driven through it."""
+        if not await self._wait_until_driven(start_pose, window.start):
+            return False
+        nozzle_start = self._nozzle_position()
+        try:
+            await self.sprayer_hardware.open_valve()
+            return await self._wait_until_driven(start_pose, window.end)
+        finally:
+            await self.sprayer_hardware.close_valve()
+            self._record_spray(nozzle_start, self._nozzle_position())
+
+    async def _wait_until_driven(self, start_pose: Pose, distance: float) -> bool:
+        """Wait until the robot has driven the distance along the start heading, anticipating the valve delay."""
+        def is_reached(speed: float) -> bool:
+            driven = start_pose.relative_point(self.system.robot_locator.pose.point).x
+            return driven + speed * self.VALVE_DELAY >= distance
+        return await self._wait_while_driving(is_reached)
+
+    def _nozzle_position(self) -> Point:
+        return self.system.robot_locator.pose.transform(Point(x=self.system.field_friend.WORK_X, y=0.0))
+
+    def _record_spray(self, start: Point, end: Point) -> None:
+        """Record the sprayed strip and remove the weeds within it."""
+        radius = self.sprayer_hardware.spray_radius
+        self.system.coverage_map.record_strip(start, end, radius)
+        self.last_punches.append(Point3d(x=end.x, y=end.y, z=0))
+        weeds = self.system.plant_provider.get_relevant_weeds(self.system.robot_locator.pose.point_3d())
+        positions = np.array([(weed.position.x, weed.position.y) for weed in weeds]).reshape(-1, 2)
+        sprayed_weeds = [weed.id for weed, distance in zip(weeds, distances_to_segment(positions, start, end), strict=True)
+                         if distance <= radius]
+        self.system.plant_provider.remove_weeds(sprayed_weeds)
+        self.WEEDS_HANDLED.emit(len(sprayed_weeds))
+        if isinstance(self.system.detector, rosys.vision.DetectorSimulation):
+            simulated_positions = np.array([(obj.position.x, obj.position.y)
+                                            for obj in self.system.detector.simulated_objects]).reshape(-1, 2)
+            self.system.detector.simulated_objects = [
+                obj for obj, distance in zip(self.system.detector.simulated_objects,
+                                             distances_to_segment(simulated_positions, start, end), strict=True)
+                if distance > radius]
+
     @track
     async def get_target(self) -> Point | None:
         """Return the target position to drive to."""
@@ -71,7 +204,7 @@ class WeedingSprayer(WeedingImplement):
         self.log.debug(f'Found {len(weeds_in_range)} weeds in range: {weeds_in_range}')
         for next_weed_id, next_weed_position in weeds_in_range.items():
             weed_world_position = self.system.robot_locator.pose.transform3d(next_weed_position)
-            if any(p.distance(weed_world_position) < self.sprayer_hardware.spray_radius for p in self.last_punches):
+            if self.system.coverage_map.is_treated(weed_world_position.projection()):
                 self.log.debug('Skipping weed because it was already punched')
                 continue
             relative_x = next_weed_position.x - self.system.field_friend.WORK_X
@@ -86,6 +219,7 @@ class WeedingSprayer(WeedingImplement):
 
     async def finish(self) -> None:
         await self.sprayer_hardware.stop()
+        self.pressure_readiness.reset()
         await super().finish()
 
     def backup_to_dict(self) -> dict[str, Any]:
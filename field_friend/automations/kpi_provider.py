@@ -16,6 +16,10 @@ class KPIs:
     weeds_detected: int = 0
     crops_detected: int = 0
     punches: int = 0
+    weeding_stops: int = 0
+    weeds_removed: int = 0
+    treated_area: float = 0
+    double_treated_area: float = 0
 
     bumps: int = 0
     e_stop_triggered:  int = 0
@@ -27,6 +31,19 @@ class KPIs:
     automation_failed: int = 0
     automation_completed: int = 0
 
+    @property
+    def weeds_per_stop(self) -> float:
+        return self.weeds_removed / self.weeding_stops if self.weeding_stops else 0.0
+
+    @property
+    def stops_per_meter(self) -> float:
+        return self.weeding_stops / self.distance if self.distance else 0.0
+
+    @property
+    def double_treatment_ratio(self) -> float:
+        """Share of the treated area which has been treated more than once."""
+        return self.double_treated_area / self.treated_area if self.treated_area else 0.0
+
 
 class KpiProvider(KpiLogger):
     def __init__(self) -> None:
@@ -63,6 +80,15 @@ class KpiProvider(KpiLogger):
         setattr(self.all_time_kpis, indicator, new_value)
         self.invalidate()
 
+    def count_all_time_kpi(self, indicator: str, count: int) -> None:
+        """Add ``count`` incidents to the daily and the all-time value of the indicator."""
+        if count == 0:
+            return
+        day = self.today()
+        day.incidents[indicator] = day.incidents.get(indicator, 0) + count
+        setattr(self.all_time_kpis, indicator, (getattr(self.all_time_kpis, indicator) or 0) + count)
+        self.invalidate()
+
     def get_time_as_string(self, seconds: float) -> str:
         total_seconds = int(seconds)
         hours = total_seconds // 3600
@@ -84,6 +110,8 @@ class KpiProvider(KpiLogger):
             'crops_detected': lambda: randint(0, 100),
             'weeds_detected': lambda: randint(0, 500),
             'punches': lambda: randint(0, 200),
+            'weeding_stops': lambda: randint(0, 150),
+            'weeds_removed': lambda: randint(0, 300),
 
             'automation_paused': lambda: randint(0, 2),
             'automation_stopped': lambda: randint(0, 2),
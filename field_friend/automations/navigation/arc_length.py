@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import numpy as np
+from rosys.geometry import Point, Spline
+
+RESOLUTION = 0.01
+MIN_SAMPLES = 20
+MAX_SAMPLES = 10_000
+EXTENSION = 0.2
+
+
+class ArcLengthTable:
+    """Lookup table between the spline parameter t and the distance along a spline.
+
+    The spline is sampled about every ``RESOLUTION`` meters once, including an extension of ``EXTENSION`` beyond both ends
+    to support parameters slightly outside of [0, 1] like the ones of ``Spline.closest_point``.
+    Conversions are binary searches in the cumulative lengths of the samples.
+    Distances are measured from the start of the spline and are negative before it.
+    """
+
+    def __init__(self, spline: Spline) -> None:
+        self.spline = spline
+        count = int(np.clip(np.ceil(spline.estimated_length() / RESOLUTION), MIN_SAMPLES, MAX_SAMPLES))
+        extension_count = max(int(count * EXTENSION), 2)
+        self.t = np.concatenate((np.linspace(-EXTENSION, 0.0, extension_count)[:-1],
+                                 np.linspace(0.0, 1.0, count + 1),
+                                 np.linspace(1.0, 1.0 + EXTENSION, extension_count)[1:]))
+        self.points = np.column_stack((spline.x(self.t), spline.y(self.t)))
+        steps = np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+        distances = np.concatenate(([0.0], np.cumsum(steps)))
+        self.distances = distances - distances[extension_count - 1]
+        self.length = float(self.distances[extension_count - 1 + count])
+
+    def distance_at(self, t: float) -> float:
+        """Distance along the spline from its start to the parameter ``t``."""
+        return float(np.interp(t, self.t, self.distances))
+
+    def t_at(self, distance: float) -> float:
+        """Parameter of the point at the given distance along the spline from its start."""
+        return float(np.interp(distance, self.distances, self.t))
+
+    def advance_by(self, t: float, distance: float) -> float:
+        """Parameter of the point ``distance`` meters further along the spline than ``t`` (backwards if negative)."""
+        return self.t_at(self.distance_at(t) + distance)
+
+    def closest_t(self, point: Point, *, t_min: float = 0.0, t_max: float = 1.0) -> float:
+        """Parameter of the point on the spline closest to the given point within [``t_min``, ``t_max``].
+
+        The nearest sample is refined by projecting the point onto its neighbouring chords.
+        """
+        p = np.array([point.x, point.y])
+        squared_distances = np.sum((self.points - p)**2, axis=1)
+        squared_distances[(self.t < t_min) | (self.t > t_max)] = np.inf
+        index = int(np.argmin(squared_distances))
+        best_t = float(self.t[index])
+        best_squared_distance = float(squared_distances[index])
+        for i in (index - 1, index):
+            if not 0 <= i < len(self.t) - 1:
+                continue
+            a = self.points[i]
+            ab = self.points[i + 1] - a
+            length_squared = float(ab @ ab)
+            if length_squared == 0:
+                continue
+            fraction = float(np.clip((p - a) @ ab / length_squared, 0.0, 1.0))
+            t = float(np.clip(self.t[i] + fraction * (self.t[i + 1] - self.t[i]), t_min, t_max))
+            squared_distance = float(np.sum((np.array([self.spline.x(t), self.spline.y(t)]) - p)**2))
+            if squared_distance < best_squared_distance:
+                best_t, best_squared_distance = t, squared_distance
+        return best_t
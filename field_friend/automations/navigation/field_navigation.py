@@ -32,6 +32,7 @@ class FieldNavigation(WaypointNavigation):
     START_ROW_INDEX = 0
     RETURN_TO_START = True
     CHARGE_AUTOMATICALLY = False
+    USE_CROP_MAP = True
 
     def __init__(self, system: System, implement: Implement) -> None:
         super().__init__(system, implement)
@@ -48,6 +49,8 @@ class FieldNavigation(WaypointNavigation):
         self.return_to_start = self.RETURN_TO_START
         self.charge_automatically = self.CHARGE_AUTOMATICALLY
         self.force_charge = False
+        self.use_crop_map = self.USE_CROP_MAP
+        self.SEGMENT_COMPLETED.register(self._handle_segment_completed)
 
     @property
     def field(self) -> Field | None:
@@ -62,6 +65,12 @@ class FieldNavigation(WaypointNavigation):
         if isinstance(segment, RowSegment) and isinstance(self.implement, WeedingImplement):
             self.log.debug(f'Setting crop to {segment.row.crop}')
             self.implement.cultivated_crop = segment.row.crop
+        if isinstance(segment, RowSegment) and segment.use_implement and self.use_crop_map and self.field is not None:
+            self.system.crop_map.load_row(self.field, segment.row)
+
+    def _handle_segment_completed(self, segment: DriveSegment) -> None:
+        if isinstance(segment, RowSegment) and segment.use_implement and self.use_crop_map and self.field is not None:
+            self.system.crop_map.save_row(self.field, segment.row)
 
     @track
     async def prepare(self) -> bool:
@@ -363,6 +372,7 @@ class FieldNavigation(WaypointNavigation):
             'charge_automatically': self.charge_automatically,
             'battery_charge_percentage': self.battery_charge_percentage,
             'battery_working_percentage': self.battery_working_percentage,
+            'use_crop_map': self.use_crop_map,
         }
 
     def restore_from_dict(self, data: dict[str, Any]) -> None:
@@ -372,6 +382,7 @@ class FieldNavigation(WaypointNavigation):
         self.charge_automatically = data.get('charge_automatically', self.CHARGE_AUTOMATICALLY)
         self.battery_charge_percentage = data.get('battery_charge_percentage', self.BATTERY_CHARGE_PERCENTAGE)
         self.battery_working_percentage = data.get('battery_working_percentage', self.BATTERY_WORKING_PERCENTAGE)
+        self.use_crop_map = data.get('use_crop_map', self.USE_CROP_MAP)
 
     def settings_ui(self) -> None:
         super().settings_ui()
@@ -395,6 +406,9 @@ class FieldNavigation(WaypointNavigation):
                         backward=lambda v: v and self.field is not None and self.field.charge_dock_pose is not None) \
             .bind_visibility_from(self, 'field', lambda field: field is not None and field.charge_dock_pose is not None) \
             .tooltip('Let the robot charge automatically when a charging station is provided')
+        ui.checkbox('Use crop map', on_change=self.request_backup) \
+            .bind_value(self, 'use_crop_map') \
+            .tooltip('Remember the crops of each row and use them as prior on the next pass over the field')
 
     def developer_ui(self):
         ui.label('Field Navigation').classes('text-center text-bold')
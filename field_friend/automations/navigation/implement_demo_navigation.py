@@ -31,7 +31,8 @@ class ImplementDemoNavigation(WaypointNavigation):
         if not isinstance(self.implement, WeedingImplement) and self.system.field_friend.y_axis is not None:
             rosys.notify('Implement Demo only works with a weeding implement', 'negative')
             return False
-        await self.implement.activate()
+        if not await self.implement.activate():
+            return False
         assert isinstance(self.implement, WeedingImplement)
         self.implement.puncher.is_demo = True
         return True
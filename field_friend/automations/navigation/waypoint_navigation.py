@@ -3,7 +3,7 @@ from __future__ import annotations
 import gc
 import logging
 from abc import abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from random import randint
 from typing import TYPE_CHECKING, Any, Self
 
@@ -19,11 +19,13 @@ from rosys.hardware import Gnss
 from ..entity_locator import EntityLocator
 from ..implements.implement import Implement
 from ..implements.weeding_implement import WeedingImplement
+from .arc_length import ArcLengthTable
 
 if TYPE_CHECKING:
     from ...system import System
 
 
+ADVANCE_MARGIN = 0.0001
 WAYPOINTS = [Point(x=3.0 * x, y=x % 2) for x in range(1, 15)]
 
 
@@ -119,7 +121,9 @@ class WaypointNavigation(rosys.persistence.Persistable):
             if not await self.implement.prepare():
                 self.log.error('Implement preparation failed')
                 return
-            await self.implement.activate()
+            if not await self.implement.activate():
+                self.log.error('Implement activation failed')
+                return
             rosys.notify('Automation started')
             self.log.debug('Navigation started')
 
@@ -153,14 +157,64 @@ class WaypointNavigation(rosys.persistence.Persistable):
             if not implement_target:
                 self.log.debug('Implement has no target anymore. Possibly overshot, continuing...')
                 return
-            if not await self._follow_segment_until(implement_target):
+            if self.implement.drive_while_weeding and await self._work_while_driving(implement_target):
+                return
+            if not await self._approach(implement_target):
                 assert isinstance(self.detector, rosys.vision.Detector)
                 await self.detector.NEW_DETECTIONS.emitted(5)
                 return
+            t = rosys.time()
             await self.driver.wheels.stop()
             self.implement.has_plants_to_handle()
             await self.implement.start_workflow()
             await self.implement.stop_workflow()
+            self.implement.punch_cycle_durations.append(rosys.time() - t)
+            self.log.debug('Punch cycle took %.2f s', rosys.time() - t)
+
+    async def _approach(self, target: Point) -> bool:
+        """Follow the segment until the target while the implement's y-axis is already moved to the target."""
+        assert isinstance(self.implement, WeedingImplement)
+        if not self.implement.preposition_y_axis:
+            return await self._follow_segment_until(target)
+        reached = False
+
+        async def follow() -> None:
+            nonlocal reached
+            reached = await self._follow_segment_until(target)
+        await rosys.automation.parallelize(follow(), self.implement.move_y_axis_to_target())
+        return reached
+
+    async def _work_while_driving(self, target: Point) -> bool:
+        """Let the implement work on the target while driving over it.
+
+        Returns ``False`` without driving if the target cannot be intercepted in time or not before the end of the segment,
+        so the robot has to stop at it.
+        A workflow which has started when the segment is completed is awaited, so the tool is never aborted mid-stroke.
+        """
+        assert isinstance(self.implement, WeedingImplement)
+        speed = min(self.linear_speed_limit, self.implement.max_intercept_speed)
+        if speed <= 0:
+            self.log.warning('Can not intercept targets at a speed of %.2f m/s, stopping at them...', speed)
+            return False
+        assert self.current_segment is not None
+        target_pose = self._target_pose_on_current_segment(target)
+        if self.current_segment.arc_length.closest_t(target_pose.point, t_min=-0.2, t_max=1.2) >= 1.0:
+            self.log.debug('Target is beyond the end of the segment, stopping at it...')
+            return False
+        distance = self.robot_locator.pose.relative_point(target_pose.point).x
+        preparation_time = self.implement.intercept_preparation_time()
+        if distance <= 0 or distance / speed < preparation_time:
+            self.log.debug('Target %.3f m ahead can not be intercepted within %.2f s, stopping at it...', distance, preparation_time)
+            return False
+        self.log.debug('Intercepting target %.3f m ahead while driving at %.2f m/s', distance, speed)
+
+        async def drive() -> None:
+            await self._drive_along_segment(linear_speed_limit=speed)
+            assert isinstance(self.implement, WeedingImplement)
+            while self.implement.is_working:
+                await rosys.sleep(0.01)
+        await rosys.automation.parallelize(drive(), self.implement.intercept(target), return_when_first_completed=True)
+        return True
 
     @track
     async def finish(self) -> None:
@@ -195,7 +249,7 @@ class WaypointNavigation(rosys.persistence.Persistable):
         current_pose = self.robot_locator.pose
         start_index = 0
         for i, segment in enumerate(path_segments):
-            t = segment.spline.closest_point(current_pose.x, current_pose.y, t_min=-0.1, t_max=1.1)
+            t = segment.arc_length.closest_t(current_pose.point, t_min=-0.1, t_max=1.1)
             if t > 0.99:
                 continue
             start_index = i
@@ -213,26 +267,20 @@ class WaypointNavigation(rosys.persistence.Persistable):
             return False
         current_pose = self.robot_locator.pose
         spline = current_segment.spline
-        current_t = spline.closest_point(current_pose.x, current_pose.y)
-        target_t = spline.closest_point(target.x, target.y, t_min=-0.2, t_max=1.2)
+        arc_length = current_segment.arc_length
+        current_t = arc_length.closest_t(current_pose.point)
         work_x_corrected_pose = self._target_pose_on_current_segment(target)
         distance_to_target = current_pose.distance(work_x_corrected_pose)
-        target_t = spline.closest_point(work_x_corrected_pose.x, work_x_corrected_pose.y, t_min=-0.2, t_max=1.2)
+        target_t = arc_length.closest_t(work_x_corrected_pose.point, t_min=-0.2, t_max=1.2)
         if abs(distance_to_target) < self.driver.parameters.minimum_drive_distance:
             # TODO: quickfix for weeds behind the robot
             self.log.debug('Target close, working with out advancing... (%.6f m)', distance_to_target)
             return True
         if target_t < current_t or target_t > 1.0:
-            # TODO: we need a sturdy function to advance a certain distance on a spline, because this method is off by a tiny amount. That's why +0.00003
+            # NOTE: advance slightly more than the minimum drive distance, otherwise the driver skips the spline
             # test_weeding.py::test_advance_when_target_behind_robot tests this case. The weed is skipped in this case
-            advance_distance = self.driver.parameters.minimum_drive_distance
-            while True:
-                target_pose = current_pose + PoseStep(linear=advance_distance, angular=0.0, time=0.0)
-                target_t = spline.closest_point(target_pose.x, target_pose.y)
-                advance_spline = sub_spline(spline, current_t, target_t)
-                if advance_spline.estimated_length() > self.driver.parameters.minimum_drive_distance:
-                    break
-                advance_distance += 0.00001
+            advance_distance = self.driver.parameters.minimum_drive_distance + ADVANCE_MARGIN
+            advance_spline = sub_spline(spline, current_t, arc_length.advance_by(current_t, advance_distance))
             self.log.debug('Target behind robot, continue for %.6f meters', advance_distance)
             with self.driver.parameters.set(linear_speed_limit=self.linear_speed_limit):
                 await self.driver.drive_spline(advance_spline, throttle_at_end=False, stop_at_end=False)
@@ -245,9 +293,9 @@ class WaypointNavigation(rosys.persistence.Persistable):
 
     def _target_pose_on_current_segment(self, target: Point) -> Pose:
         assert self.current_segment is not None
-        spline = self.current_segment.spline
-        target_t = spline.closest_point(target.x, target.y, t_min=-0.2, t_max=1.2)
-        target_pose = spline.pose(target_t)
+        arc_length = self.current_segment.arc_length
+        target_t = arc_length.closest_t(target, t_min=-0.2, t_max=1.2)
+        target_pose = self.current_segment.spline.pose(target_t)
         return target_pose + PoseStep(linear=-self.system.field_friend.WORK_X, angular=0, time=0)
 
     async def _get_valid_implement_target(self) -> Point | None:
@@ -256,13 +304,13 @@ class WaypointNavigation(rosys.persistence.Persistable):
         implement_target = await self.implement.get_target()
         if not implement_target:
             return None
-        t = self.current_segment.spline.closest_point(implement_target.x, implement_target.y)
+        t = self.current_segment.arc_length.closest_t(implement_target)
         if t in (0.0, 1.0):
             self.log.debug('Target is on segment end, continuing...')
             return None
         work_x_corrected_pose = self._target_pose_on_current_segment(implement_target)
         distance_to_target = self.robot_locator.pose.distance(work_x_corrected_pose)
-        t = self.current_segment.spline.closest_point(work_x_corrected_pose.x, work_x_corrected_pose.y)
+        t = self.current_segment.arc_length.closest_t(work_x_corrected_pose.point)
         if t in (0.0, 1.0) and abs(distance_to_target) > self.driver.parameters.minimum_drive_distance:
             # TODO: quickfix for weeds behind the robot
             self.log.debug('WorkX corrected target is on segment end, continuing...')
@@ -324,6 +372,14 @@ class DriveSegment(rosys.driving.PathSegment):
     # TODO: move methods to rosys.driving.PathSegment
     use_implement: bool = False
     stop_at_end: bool = True
+    _arc_length: ArcLengthTable | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def arc_length(self) -> ArcLengthTable:
+        """Arc-length lookup table of the spline, which is computed on first access."""
+        if self._arc_length is None or self._arc_length.spline is not self.spline:
+            self._arc_length = ArcLengthTable(self.spline)
+        return self._arc_length
 
     @property
     def start(self) -> Pose:
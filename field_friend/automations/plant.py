@@ -3,34 +3,146 @@ from dataclasses import dataclass, field
 from uuid import uuid4
 
 from rosys.geometry import Point3d
-from rosys.vision import Image
+
+from .image_store import ImageReference
+
+MAX_HISTORY = 20
+
+
+class History(deque):
+    """Deque which counts its modifications, so that values derived from it can be kept up to date."""
+    __slots__ = ('modifications',)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.modifications = 0
+
+    def append(self, x) -> None:
+        self.modifications += 1
+        super().append(x)
+
+    def appendleft(self, x) -> None:
+        self.modifications += 1
+        super().appendleft(x)
+
+    def extend(self, iterable) -> None:
+        self.modifications += 1
+        super().extend(iterable)
+
+    def extendleft(self, iterable) -> None:
+        self.modifications += 1
+        super().extendleft(iterable)
+
+    def insert(self, i, x) -> None:
+        self.modifications += 1
+        super().insert(i, x)
+
+    def pop(self):
+        self.modifications += 1
+        return super().pop()
+
+    def popleft(self):
+        self.modifications += 1
+        return super().popleft()
+
+    def remove(self, value) -> None:
+        self.modifications += 1
+        super().remove(value)
+
+    def clear(self) -> None:
+        self.modifications += 1
+        super().clear()
+
+    def __setitem__(self, index, value) -> None:
+        self.modifications += 1
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index) -> None:
+        self.modifications += 1
+        super().__delitem__(index)
+
+    def __iadd__(self, other):
+        self.modifications += 1
+        return super().__iadd__(other)
+
+
+def _version(history: deque) -> tuple[History, int] | None:
+    """The history with its modification count, or ``None`` if its modifications are not counted."""
+    return (history, history.modifications) if isinstance(history, History) else None
+
+
+def _is_current(version: tuple[History, int] | None, history: deque) -> bool:
+    return version is not None and version[0] is history and version[1] == history.modifications
 
 
 @dataclass(slots=True, kw_only=True)
 class Plant:
     id: str = field(default_factory=lambda: str(uuid4()))
     type: str
-    positions: deque[Point3d] = field(default_factory=lambda: deque(maxlen=20))
+    positions: deque[Point3d] = field(default_factory=lambda: History(maxlen=MAX_HISTORY))
     detection_time: float
-    confidences: deque[float] = field(default_factory=lambda: deque(maxlen=20))
-    detection_image: Image | None = None
+    confidences: deque[float] = field(default_factory=lambda: History(maxlen=MAX_HISTORY))
+    detection_image: ImageReference | None = None
+    is_prior: bool = False
+    """The plant is only remembered from an earlier run and has not been detected yet."""
+
+    # NOTE: running sums which are kept up to date by add_observation, so position and confidence are constant time
+    _position_sum: list[float] = field(default_factory=lambda: [0.0, 0.0, 0.0], init=False, repr=False, compare=False)
+    _position_version: tuple[History, int] | None = field(default=None, init=False, repr=False, compare=False)
+    _confidence_sum: float = field(default=0.0, init=False, repr=False, compare=False)
+    _confidence_version: tuple[History, int] | None = field(default=None, init=False, repr=False, compare=False)
+    _evictions: int = field(default=0, init=False, repr=False, compare=False)
 
     @property
     def position(self) -> Point3d:
         """Calculate the middle position of all points"""
-        total_x = sum(point3d.x for point3d in self.positions)
-        total_y = sum(point3d.y for point3d in self.positions)
-        total_z = sum(point3d.z for point3d in self.positions)
-
-        middle_x = total_x / len(self.positions)
-        middle_y = total_y / len(self.positions)
-        middle_z = total_z / len(self.positions)
-
-        return Point3d(x=middle_x, y=middle_y, z=middle_z)
+        self._update_sums()
+        count = len(self.positions)
+        return Point3d(x=self._position_sum[0] / count, y=self._position_sum[1] / count, z=self._position_sum[2] / count)
 
     @property
     def confidence(self) -> float:
         # TODO: maybe use weighted confidence
         # sum_confidence = sum(confidence**1.5 for confidence in self.confidences)
-        sum_confidence = sum(self.confidences)
-        return sum_confidence
+        self._update_sums()
+        return self._confidence_sum
+
+    def add_observation(self, position: Point3d, confidence: float) -> None:
+        """Add an observed position and confidence, evicting the oldest ones beyond the history length."""
+        self._update_sums()
+        if len(self.positions) == self.positions.maxlen:
+            evicted = self.positions[0]
+            self._position_sum[0] -= evicted.x
+            self._position_sum[1] -= evicted.y
+            self._position_sum[2] -= evicted.z
+            self._evictions += 1
+        if len(self.confidences) == self.confidences.maxlen:
+            self._confidence_sum -= self.confidences[0]
+        self.positions.append(position)
+        self.confidences.append(confidence)
+        self._position_sum[0] += position.x
+        self._position_sum[1] += position.y
+        self._position_sum[2] += position.z
+        self._confidence_sum += confidence
+        self._position_version = _version(self.positions)
+        self._confidence_version = _version(self.confidences)
+        if self._evictions >= MAX_HISTORY:
+            # NOTE: re-sum after each full turnover so that floating point errors can not accumulate
+            self._sum_positions()
+            self._sum_confidences()
+
+    def _update_sums(self) -> None:
+        """Recompute the sums if the histories have been modified without ``add_observation``."""
+        if not _is_current(self._position_version, self.positions):
+            self._sum_positions()
+        if not _is_current(self._confidence_version, self.confidences):
+            self._sum_confidences()
+
+    def _sum_positions(self) -> None:
+        self._position_sum = [sum(p.x for p in self.positions), sum(p.y for p in self.positions), sum(p.z for p in self.positions)]
+        self._position_version = _version(self.positions)
+        self._evictions = 0
+
+    def _sum_confidences(self) -> None:
+        self._confidence_sum = sum(self.confidences)
+        self._confidence_version = _version(self.confidences)
@@ -0,0 +1,30 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from .plant import Plant
+
+
+def associate(observations: list[Plant], candidates: list[Plant], max_distance: float) -> list[tuple[int, int]]:
+    """Pair observations with candidates of the same type so that the sum of distances is minimal.
+
+    Pairs which are at least ``max_distance`` apart are never matched.
+    Returns the indices of the matched observations and candidates.
+    """
+    if not observations or not candidates:
+        return []
+    observed = np.array([(p.position.x, p.position.y, p.position.z) for p in observations])
+    known = np.array([(p.position.x, p.position.y, p.position.z) for p in candidates])
+    costs = np.linalg.norm(observed[:, np.newaxis, :] - known[np.newaxis, :, :], axis=2)
+    observed_types = np.array([p.type for p in observations])
+    known_types = np.array([p.type for p in candidates])
+    is_valid = (costs < max_distance) & (observed_types[:, np.newaxis] == known_types[np.newaxis, :])
+    if not is_valid.any():
+        return []
+    rows = np.flatnonzero(is_valid.any(axis=1))
+    cols = np.flatnonzero(is_valid.any(axis=0))
+    costs = costs[np.ix_(rows, cols)]
+    is_valid = is_valid[np.ix_(rows, cols)]
+    # NOTE: invalid pairs cost more than all valid pairs together, so the solver first maximizes the number of matches
+    costs[~is_valid] = max_distance * (min(costs.shape) + 1)
+    row_indices, col_indices = linear_sum_assignment(costs)
+    return [(int(rows[r]), int(cols[c])) for r, c in zip(row_indices, col_indices, strict=True) if is_valid[r, c]]
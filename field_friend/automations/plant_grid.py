@@ -0,0 +1,76 @@
+import math
+
+from rosys.geometry import Point3d
+
+from .plant import Plant
+
+Cell = tuple[int, int]
+
+
+class PlantGrid:
+    """Spatial hash of plants on the ground plane for constant-time neighbourhood queries."""
+
+    def __init__(self, cell_size: float = 0.1) -> None:
+        self.cell_size = cell_size
+        self._cells: dict[Cell, dict[str, Plant]] = {}
+        self._plant_cells: dict[str, Cell] = {}
+        self._order: dict[str, int] = {}
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._plant_cells)
+
+    def add(self, plant: Plant) -> None:
+        self._order[plant.id] = self._counter
+        self._counter += 1
+        self._insert(plant)
+
+    def update(self, plant: Plant) -> None:
+        """Move the plant to the cell of its current position (e.g. after new positions were merged)."""
+        cell = self._cell(plant.position)
+        if self._plant_cells.get(plant.id) == cell:
+            return
+        self._discard(plant.id)
+        self._insert(plant)
+
+    def remove(self, plant_id: str) -> None:
+        self._discard(plant_id)
+        self._order.pop(plant_id, None)
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._plant_cells.clear()
+        self._order.clear()
+
+    def query(self, point: Point3d, max_distance: float) -> list[Plant]:
+        """Return all plants within ``max_distance`` of ``point`` in insertion order."""
+        min_cell = self._cell(Point3d(x=point.x - max_distance, y=point.y - max_distance, z=0))
+        max_cell = self._cell(Point3d(x=point.x + max_distance, y=point.y + max_distance, z=0))
+        num_cells = (max_cell[0] - min_cell[0] + 1) * (max_cell[1] - min_cell[1] + 1)
+        if num_cells > len(self._cells):
+            cells = list(self._cells.values())
+        else:
+            cells = [self._cells[(i, j)]
+                     for i in range(min_cell[0], max_cell[0] + 1)
+                     for j in range(min_cell[1], max_cell[1] + 1)
+                     if (i, j) in self._cells]
+        plants = [plant for cell in cells for plant in cell.values() if plant.position.distance(point) <= max_distance]
+        plants.sort(key=lambda plant: self._order[plant.id])
+        return plants
+
+    def _cell(self, point: Point3d) -> Cell:
+        return math.floor(point.x / self.cell_size), math.floor(point.y / self.cell_size)
+
+    def _insert(self, plant: Plant) -> None:
+        cell = self._cell(plant.position)
+        self._cells.setdefault(cell, {})[plant.id] = plant
+        self._plant_cells[plant.id] = cell
+
+    def _discard(self, plant_id: str) -> None:
+        cell = self._plant_cells.pop(plant_id, None)
+        if cell is None:
+            return
+        plants = self._cells[cell]
+        del plants[plant_id]
+        if not plants:
+            del self._cells[cell]
@@ -1,18 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from collections import deque
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, ClassVar
 
+import numpy as np
 import rosys
 from nicegui import ui
+from rosys.event import Event
+from rosys.geometry import Point, Point3d, Pose
 from rosys.vision import Autoupload, DetectorSimulation
 from rosys.vision.detections import Category
 from rosys.vision.detector import DetectorException, DetectorInfo
 
 from ..vision.detector_hardware import DetectorHardware
-from ..vision.zedxmini_camera import StereoCamera
 from .entity_locator import EntityLocator
 from .plant import Plant
+from .plant_provider import PlantProvider
+from .readiness import ReadinessGate
 
 if TYPE_CHECKING:
     from ..system import System
@@ -22,12 +29,49 @@ class DetectorError(Exception):
     pass
 
 
+@dataclass(slots=True, kw_only=True)
+class PendingDetection:
+    camera: rosys.vision.CalibratableCamera
+    image: rosys.vision.Image
+    pose: Pose
+    task: asyncio.Task
+
+
+@dataclass(slots=True, kw_only=True)
+class DetectionStats:
+    frames: int = 0
+    dropped: int = 0
+    latency: float = 0.0
+    wakeups: int = 0
+    frame_times: deque[float] = field(default_factory=lambda: deque(maxlen=50))
+
+    def add_frame(self, *, latency: float) -> None:
+        self.frames += 1
+        self.latency = latency
+        self.frame_times.append(rosys.time())
+
+    @property
+    def rate(self) -> float:
+        """Handled frames per second over the recent frames."""
+        if len(self.frame_times) < 2 or self.frame_times[-1] == self.frame_times[0]:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+
+def _relative_point3d(pose: Pose, point: Point3d) -> Point3d:
+    relative = pose.relative_point(point.projection())
+    return Point3d(x=relative.x, y=relative.y, z=point.z)
+
+
 class PlantLocator(EntityLocator):
     INTERVAL = 0.01
     WEED_CATEGORY_NAME: ClassVar[list[str]] = ['weed', 'weedy_area', 'coin', 'big_weed']
     CROP_CATEGORY_NAME: ClassVar[dict[str, str]] = {}
     MINIMUM_CROP_CONFIDENCE = 0.3
     MINIMUM_WEED_CONFIDENCE = 0.3
+    MAX_DETECTIONS_IN_FLIGHT = 1
+    IMAGE_TIMEOUT = 1.0
+    FIRST_DETECTION_TIMEOUT = 5.0
 
     def __init__(self, system: System) -> None:
         super().__init__(system)
@@ -49,8 +93,22 @@ class PlantLocator(EntityLocator):
         self.crop_category_names: dict[str, str] = self.CROP_CATEGORY_NAME
         self.minimum_crop_confidence: float = self.MINIMUM_CROP_CONFIDENCE
         self.minimum_weed_confidence: float = self.MINIMUM_WEED_CONFIDENCE
+        self.max_detections_in_flight: int = self.MAX_DETECTIONS_IN_FLIGHT
         self.detector_error = False
         self.last_detection_time = rosys.time()
+        self.detection_stats: dict[str, DetectionStats] = {}
+        self._camera_tasks: dict[str, asyncio.Task] = {}
+        self._uncalibrated_camera_ids: set[str] = set()
+        self._new_image_events: dict[str, asyncio.Event] = {}
+
+        self.NEW_DETECTIONS: Event[PendingDetection] = Event()
+        """Detections of an image have been handled (argument: the completed detection)."""
+
+        self._has_new_detections = False
+        # NOTE: a slow detector only delays the first targets, so the implements do not abort because of it
+        self.readiness = ReadinessGate('plant locator', lambda: self._has_new_detections,
+                                       timeout=self.FIRST_DETECTION_TIMEOUT, required=False)
+
         if self.camera_provider is None:
             self.log.warning('no camera provider configured, cant locate plants')
             return
@@ -68,6 +126,7 @@ class PlantLocator(EntityLocator):
             'minimum_crop_confidence': self.minimum_crop_confidence,
             'autoupload': self.autoupload.value,
             'tags': self.tags,
+            'max_detections_in_flight': self.max_detections_in_flight,
         }
 
     def restore_from_dict(self, data: dict[str, Any]) -> None:
@@ -77,74 +136,224 @@ class PlantLocator(EntityLocator):
         self.autoupload = Autoupload(data.get('autoupload', self.autoupload)) \
             if 'autoupload' in data else Autoupload.FILTERED
         self.tags = data.get('tags', self.tags)
+        self.max_detections_in_flight = data.get('max_detections_in_flight', self.MAX_DETECTIONS_IN_FLIGHT)
 
     async def _detect_plants(self) -> None:
+        """Keep a detection loop running for each connected and calibrated camera while the locator is active."""
         while True:
-            if self.is_paused or self.automator.is_paused:
-                await rosys.sleep(self.interval)
-                continue
-            t = rosys.time()
-            t_difference = t - self.last_detection_time
-            if t_difference < self.interval:
-                await rosys.sleep(self.interval - t_difference)
-                continue
-            assert self.camera_provider is not None
-            camera = next((camera for camera in self.camera_provider.cameras.values() if camera.is_connected), None)
-            if not camera:
-                self.log.error('no connected camera found')
+            self._update_detection_loops()
+            await rosys.sleep(1.0)
+
+    def _update_detection_loops(self) -> None:
+        if self.camera_provider is None:
+            return
+        for camera in self.camera_provider.cameras.values():
+            task = self._camera_tasks.get(camera.id)
+            if task is not None and not task.done():
+                if not camera.is_connected:
+                    self.log.debug('camera %s disconnected, stopping its detection loop', camera.id)
+                    task.cancel()
                 continue
-            assert isinstance(camera, rosys.vision.CalibratableCamera)
-            if camera.calibration is None:
-                self.log.error(f'no calibration found for camera {camera.name}')
-                raise DetectorError()
-            if not self.crop_category_names:
-                self.log.warning('No crop categories defined')
-                await self.fetch_detector_info()
-            new_image = camera.latest_captured_image
-            if new_image is None or new_image.detections:
-                await rosys.sleep(0.01)
+            if self.is_paused or not camera.is_connected:
                 continue
-            assert self.detector is not None
-            self.last_detection_time = rosys.time()
-            await self.detector.detect(new_image, autoupload=self.autoupload, tags=[*self.tags, self.robot_id, 'autoupload'], source=self.robot_id)
-            if not new_image.detections:
+            if not isinstance(camera, rosys.vision.CalibratableCamera) or camera.calibration is None:
+                if camera.id not in self._uncalibrated_camera_ids:
+                    self.log.error(f'no calibration found for camera {camera.name}')
+                    self._uncalibrated_camera_ids.add(camera.id)
                 continue
+            self._uncalibrated_camera_ids.discard(camera.id)
+            if camera.id not in self._new_image_events:
+                self._new_image_events[camera.id] = asyncio.Event()
+                camera.NEW_IMAGE.register(self._notify_new_image)
+            self.log.debug('starting detection loop for camera %s', camera.id)
+            self._camera_tasks[camera.id] = rosys.background_tasks.create(self._detect_plants_with(camera),
+                                                                          name=f'detect plants with {camera.id}')
+
+    def _stop_detection_loops(self) -> None:
+        for task in self._camera_tasks.values():
+            task.cancel()
+        self._camera_tasks.clear()
+
+    def _notify_new_image(self, image: rosys.vision.Image) -> None:
+        event = self._new_image_events.get(image.camera_id)
+        if event is not None:
+            event.set()
 
-            for d in new_image.detections.points:
-                if isinstance(self.detector, rosys.vision.DetectorSimulation):
-                    # NOTE we drop detections at the edge of the vision because in reality they are blocked by the chassis
-                    dead_zone = 80
-                    if d.cx < dead_zone or d.cx > new_image.size.width - dead_zone or d.cy < dead_zone:
-                        continue
-                image_point = rosys.geometry.Point(x=d.cx, y=d.cy)
-                world_point_3d: rosys.geometry.Point3d | None = None
-                if isinstance(camera, StereoCamera):
-                    world_point_3d = camera.calibration.project_from_image(image_point)
-                    # TODO: 3d detection
-                    # camera_point_3d: Point3d | None = await camera.get_point(
-                    #     int(d.cx), int(d.cy))
-                    # if camera_point_3d is None:
-                    #     self.log.error('could not get a depth value for detection')
-                    #     continue
-                    # camera.calibration.extrinsics = camera.calibration.extrinsics.as_frame(
-                    #     'zedxmini').in_frame(self.robot_locator.pose_frame)
-                    # world_point_3d = camera_point_3d.in_frame(camera.calibration.extrinsics).resolve()
-                else:
-                    world_point_3d = camera.calibration.project_from_image(image_point)
-                if world_point_3d is None:
-                    self.log.debug('Failed to generate world point from %s', image_point)
+    async def _wait_for_new_image(self, camera: rosys.vision.CalibratableCamera, pending: deque[PendingDetection]) -> None:
+        """Wait until the camera delivers a new image or the oldest pending detection finishes.
+
+        The timeout makes sure a camera which silently stops delivering images is noticed.
+        """
+        new_image = self._new_image_events[camera.id]
+        new_image.clear()
+        image_waiter = asyncio.create_task(new_image.wait())
+        timeout = asyncio.create_task(rosys.sleep(self.IMAGE_TIMEOUT))
+        await asyncio.wait([image_waiter, timeout, *([pending[0].task] if pending else [])],
+                           return_when=asyncio.FIRST_COMPLETED)
+        image_waiter.cancel()
+        timeout.cancel()
+
+    def pause(self) -> None:
+        super().pause()
+        self._stop_detection_loops()
+
+    def resume(self) -> None:
+        super().resume()
+        self._has_new_detections = False
+        self.readiness.reset()
+        self.readiness.start()
+        for event in self._new_image_events.values():
+            event.set()
+        self._update_detection_loops()
+
+    async def _detect_plants_with(self, camera: rosys.vision.CalibratableCamera) -> None:
+        stats = self.detection_stats.setdefault(camera.id, DetectionStats())
+        pending: deque[PendingDetection] = deque()
+        last_detection_time = 0.0
+        try:
+            while camera.is_connected or pending:
+                stats.wakeups += 1
+                while pending and pending[0].task.done():
+                    detection = pending.popleft()
+                    try:
+                        await self._handle_detection(detection, stats)
+                    except Exception:
+                        self.log.exception('Failed to handle detections of camera %s', camera.id)
+                if not camera.is_connected:
+                    if pending:
+                        await asyncio.wait([pending[0].task])
+                    continue
+                if self.is_paused or self.automator.is_paused:
+                    await self._wait_for_new_image(camera, pending)
                     continue
-                plant = Plant(type=d.category_name,
-                              detection_time=rosys.time(),
-                              detection_image=new_image)
-                plant.positions.append(world_point_3d)
-                plant.confidences.append(d.confidence)
-                if d.category_name in self.weed_category_names and d.confidence >= self.minimum_weed_confidence:
-                    await self.plant_provider.add_weed(plant)
-                elif d.category_name in self.crop_category_names and d.confidence >= self.minimum_crop_confidence:
-                    self.plant_provider.add_crop(plant)
-                elif d.category_name not in self.crop_category_names and d.category_name not in self.weed_category_names:
-                    self.log.error('Detected category "%s" is unknown', d.category_name)
+                if len(pending) >= self.max_detections_in_flight:
+                    await asyncio.wait([pending[0].task])
+                    continue
+                t_difference = rosys.time() - last_detection_time
+                if t_difference < self.interval:
+                    await rosys.sleep(self.interval - t_difference)
+                    continue
+                if not self.crop_category_names:
+                    self.log.warning('No crop categories defined')
+                    await self.fetch_detector_info()
+                new_image = camera.latest_captured_image
+                if new_image is None or new_image.detections or any(p.image is new_image for p in pending):
+                    await self._wait_for_new_image(camera, pending)
+                    continue
+                assert self.detector is not None
+                last_detection_time = rosys.time()
+                self.last_detection_time = last_detection_time
+                task = asyncio.create_task(self.detector.detect(new_image,
+                                                                autoupload=self.autoupload,
+                                                                tags=[*self.tags, self.robot_id, 'autoupload'],
+                                                                source=self.robot_id))
+                pending.append(PendingDetection(camera=camera, image=new_image, pose=self.robot_locator.pose, task=task))
+        finally:
+            for detection in pending:
+                detection.task.cancel()
+        self.log.debug('camera %s disconnected, stopping its detection loop', camera.id)
+
+    async def _handle_detection(self, detection: PendingDetection, stats: DetectionStats) -> None:
+        if detection.task.cancelled():
+            return
+        try:
+            detection.task.result()
+        except DetectorException as e:
+            self.log.error('Detection failed: %s', e)
+            return
+        if not detection.image.detections:
+            return
+        if self._has_passed(detection):
+            self.log.debug('Dropping detections of image %s because the robot has already passed it', detection.image.time)
+            stats.dropped += 1
+            return
+        stats.add_frame(latency=rosys.time() - detection.image.time)
+        await self.process_detections(detection.camera, detection.image, detection.pose)
+        self._has_new_detections = True
+        self.NEW_DETECTIONS.emit(detection)
+
+    async def process_detections(self, camera: rosys.vision.CalibratableCamera, image: rosys.vision.Image, pose: Pose, *,
+                                 plant_provider: PlantProvider | None = None) -> None:
+        """Add the weeds and crops detected in an image, which was captured at the given robot pose, to the plant provider.
+
+        By default the plants are added to the plant provider of the system.
+        """
+        provider = self.plant_provider if plant_provider is None else plant_provider
+        weeds, crops = self._plants_from_image(camera, image, pose)
+        if weeds or crops:
+            image_reference = provider.image_store.add(image)
+            for plant in [*weeds, *crops]:
+                plant.detection_image = image_reference
+        with provider.batch():
+            await provider.add_weeds(weeds)
+            provider.add_crops(crops)
+
+    def _has_passed(self, detection: PendingDetection) -> bool:
+        """Check if the ground seen in the image is already behind the tool."""
+        assert detection.camera.calibration is not None
+        size = detection.image.size
+        view_edges = detection.camera.calibration.project_from_image([Point(x=size.width / 2, y=0),
+                                                                       Point(x=size.width / 2, y=size.height)])
+        current_pose = self.robot_locator.pose
+        view_front_x = max((current_pose.relative_point(edge.projection()).x for edge in view_edges if edge is not None),
+                           default=None)
+        if view_front_x is None or view_front_x < self.system.field_friend.WORK_X:
+            return False
+        view_front_at_capture = detection.pose.transform(Point(x=view_front_x, y=0))
+        return current_pose.relative_point(view_front_at_capture).x < self.system.field_friend.WORK_X
+
+    def _plants_from_image(self, camera: rosys.vision.CalibratableCamera, image: rosys.vision.Image,
+                           pose: Pose) -> tuple[list[Plant], list[Plant]]:
+        """Project all detections of an image into the world at once and create weeds and crops from them.
+
+        The points are placed relative to the robot pose at which the image was captured.
+        """
+        assert camera.calibration is not None
+        assert image.detections is not None
+        detections = image.detections.points
+        if not detections:
+            return [], []
+        image_points = np.array([(d.cx, d.cy) for d in detections], dtype=np.float64)
+        confidences = np.array([d.confidence for d in detections], dtype=np.float64)
+        categories = np.array([d.category_name for d in detections])
+        is_weed = np.isin(categories, self.weed_category_names)
+        is_crop = np.isin(categories, list(self.crop_category_names))
+        for category_name in np.unique(categories[~is_weed & ~is_crop]):
+            self.log.error('Detected category "%s" is unknown', category_name)
+        is_weed &= confidences >= self.minimum_weed_confidence
+        is_crop &= (confidences >= self.minimum_crop_confidence) & ~is_weed
+        selected = is_weed | is_crop
+        if isinstance(self.detector, rosys.vision.DetectorSimulation):
+            # NOTE we drop detections at the edge of the vision because in reality they are blocked by the chassis
+            dead_zone = 80
+            selected &= (image_points[:, 0] >= dead_zone) & \
+                (image_points[:, 0] <= image.size.width - dead_zone) & \
+                (image_points[:, 1] >= dead_zone)
+        indices = np.flatnonzero(selected)
+        if len(indices) == 0:
+            return [], []
+        # TODO: use 3d detections of stereo cameras instead of projecting onto the ground plane
+        world_points = camera.calibration.project_from_image([Point(x=x, y=y) for x, y in image_points[indices].tolist()])
+        # NOTE: the calibration is attached to the current robot pose, which has moved on while the detection was in flight
+        current_pose = self.robot_locator.pose
+        if current_pose.x != pose.x or current_pose.y != pose.y or current_pose.yaw != pose.yaw:
+            world_points = [None if point is None else pose.transform3d(_relative_point3d(current_pose, point))
+                            for point in world_points]
+        detection_time = rosys.time()
+        weeds: list[Plant] = []
+        crops: list[Plant] = []
+        for index, world_point in zip(indices, world_points, strict=True):
+            detection = detections[index]
+            if world_point is None:
+                self.log.debug('Failed to generate world point from %s', image_points[index])
+                continue
+            plant = Plant(type=detection.category_name, detection_time=detection_time)
+            plant.add_observation(world_point, detection.confidence)
+            if is_weed[index]:
+                weeds.append(plant)
+            else:
+                crops.append(plant)
+        return weeds, crops
 
     def _detection_watchdog(self) -> None:
         if self.is_paused:
@@ -178,6 +387,11 @@ class PlantLocator(EntityLocator):
                     .classes('w-28') \
                     .bind_value(self, 'autoupload') \
                     .tooltip('Set the autoupload for the weeding automation')
+                ui.number('Detections in flight', format='%d', step=1, min=1, max=8, on_change=self.request_backup) \
+                    .props('dense outlined') \
+                    .classes('w-28') \
+                    .bind_value(self, 'max_detections_in_flight', forward=lambda v: max(1, int(v or 1))) \
+                    .tooltip(f'Number of images which are sent to the detector without waiting for the previous result (default: {self.MAX_DETECTIONS_IN_FLIGHT})')
                 ui.checkbox('Mobile upload', value=self._mobile_upload_permission, on_change=self._set_outbox_mode) \
                     .bind_value_to(self, '_mobile_upload_permission') \
                     .tooltip('Allow upload of images on a mobile network')
@@ -191,6 +405,29 @@ class PlantLocator(EntityLocator):
                     self.detector.developer_ui()
                 ui.separator()
 
+            @ui.refreshable
+            def throughput() -> None:
+                with ui.grid(columns=4).classes('w-full gap-0 text-xs'):
+                    for label in ['Camera', 'Rate', 'Latency', 'Dropped']:
+                        ui.label(label).classes('text-bold')
+                    for camera_id, stats in self.detection_stats.items():
+                        ui.label(camera_id)
+                        ui.label(f'{stats.rate:.1f} fps')
+                        ui.label(f'{stats.latency * 1000:.0f} ms')
+                        ui.label(f'{stats.dropped}/{stats.frames + stats.dropped}')
+            throughput()
+            ui.timer(1.0, throughput.refresh)
+
+            @ui.refreshable
+            def image_memory() -> None:
+                report = self.plant_provider.memory_report()
+                ui.label(f'Plant images: {report["referenced_images"]} referenced '
+                         f'({report["referenced_bytes"] / 1e6:.1f} MB), '
+                         f'{report["stored_images"]} stored ({report["stored_bytes"] / 1e6:.1f} MB)') \
+                    .classes('text-xs')
+            image_memory()
+            ui.timer(5.0, image_memory.refresh)
+
             @ui.refreshable
             def chips():
                 with ui.row().classes('gap-0'):
@@ -1,46 +1,150 @@
+import heapq
 import logging
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Any
 
+import numpy as np
 import rosys
 from nicegui import ui
 from rosys.event import Event
-from rosys.geometry import Point3d
+from rosys.geometry import Point, Point3d
 
+from .crop_prediction import predict_crop_positions
+from .image_store import ImageStore
 from .plant import Plant
+from .plant_association import associate
+from .plant_grid import PlantGrid
 
 # see field_friend/automations/plant_locator.py
 MINIMUM_COMBINED_CROP_CONFIDENCE = 0.9
 MINIMUM_COMBINED_WEED_CONFIDENCE = 0.9
+MINIMUM_PREDICTED_CROP_CONFIDENCE = 0.45
 MATCH_DISTANCE = 0.05
+WEED_MATCH_DISTANCE = 0.02
 CROP_SPACING = 0.18
+WEED_MAX_AGE = 10.0
+CROP_MAX_AGE = 60.0 * 300.0
 
 
-def check_if_plant_exists(plant: Plant, plants: list[Plant], distance: float) -> bool:
-    for p in plants:
-        if p.position.distance(plant.position) < distance and p.type == plant.type:
-            p.confidences.append(plant.confidence)
-            p.positions.append(plant.position)
-            p.detection_image = plant.detection_image
-            p.detection_time = plant.detection_time
-            return True
-    return False
+def merge_observation(plant: Plant, observation: Plant) -> None:
+    if plant.is_prior:
+        # NOTE: a prior only anchors the plant until it is detected, so it does not count as an observation
+        plant.positions.clear()
+        plant.confidences.clear()
+        plant.is_prior = False
+    plant.add_observation(observation.position, observation.confidence)
+    plant.detection_image = observation.detection_image
+    plant.detection_time = observation.detection_time
+
+
+class ExpiryQueue:
+    """Min-heap of plant ids ordered by the time they expire.
+
+    Entries are refreshed lazily: an entry which runs out is re-queued if its plant has been detected again since.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, plant_id: str, expiry_time: float) -> None:
+        heapq.heappush(self._heap, (expiry_time, plant_id))
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+    def pop_expired(self, now: float, expiry_time: Callable[[str], float | None]) -> list[str]:
+        """Pop the ids of all plants which are expired at ``now``.
+
+        ``expiry_time`` returns the current expiry time of a plant or ``None`` if it does not exist anymore.
+        """
+        expired: list[str] = []
+        while self._heap and self._heap[0][0] <= now:
+            _, plant_id = heapq.heappop(self._heap)
+            current_expiry_time = expiry_time(plant_id)
+            if current_expiry_time is None:
+                continue
+            if current_expiry_time > now:
+                heapq.heappush(self._heap, (current_expiry_time, plant_id))
+                continue
+            expired.append(plant_id)
+        return expired
+
+
+@dataclass(slots=True, kw_only=True)
+class PlantChanges:
+    added_weeds: set[str] = field(default_factory=set)
+    added_crops: set[str] = field(default_factory=set)
+    added_priors: set[str] = field(default_factory=set)
+    """Remembered crops which have not been detected yet; they are added to ``added_crops`` once they are."""
+    updated: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.added_weeds or self.added_crops or self.added_priors or self.updated or self.removed)
+
+    def add(self, plant_id: str, *, is_weed: bool) -> None:
+        self.added_priors.discard(plant_id)
+        self.updated.discard(plant_id)
+        (self.added_weeds if is_weed else self.added_crops).add(plant_id)
+
+    def add_prior(self, plant_id: str) -> None:
+        self.added_priors.add(plant_id)
+
+    def update(self, plant_id: str) -> None:
+        if plant_id not in self.added_weeds and plant_id not in self.added_crops and plant_id not in self.added_priors:
+            self.updated.add(plant_id)
+
+    def remove(self, plant_id: str) -> None:
+        self.updated.discard(plant_id)
+        if plant_id in self.added_weeds or plant_id in self.added_crops or plant_id in self.added_priors:
+            self.added_weeds.discard(plant_id)
+            self.added_crops.discard(plant_id)
+            self.added_priors.discard(plant_id)
+        else:
+            self.removed.add(plant_id)
 
 
 class PlantProvider(rosys.persistence.Persistable):
     def __init__(self) -> None:
         super().__init__()
         self.log = logging.getLogger('field_friend.plant_provider')
-        self.weeds: list[Plant] = []
-        self.crops: list[Plant] = []
+        self._weeds: dict[str, Plant] = {}
+        self._crops: dict[str, Plant] = {}
+        self._weed_grid = PlantGrid()
+        self._crop_grid = PlantGrid()
+        self._weed_expiries = ExpiryQueue()
+        self._crop_expiries = ExpiryQueue()
+        self._expiry_settings: tuple[float, float, dict[str, float]] = (WEED_MAX_AGE, CROP_MAX_AGE, {})
+        self._changes: PlantChanges | None = None
+        self.image_store = ImageStore()
+        self._batch_depth = 0
+        self.version = 0
+        """Counter which is increased whenever plants are added, updated or removed."""
 
         self.match_distance: float = MATCH_DISTANCE
         self.crop_spacing: float = CROP_SPACING
         self.minimum_combined_crop_confidence: float = MINIMUM_COMBINED_CROP_CONFIDENCE
         self.minimum_combined_weed_confidence: float = MINIMUM_COMBINED_WEED_CONFIDENCE
+        self.minimum_predicted_crop_confidence: float = MINIMUM_PREDICTED_CROP_CONFIDENCE
+        self.weed_max_age: float = WEED_MAX_AGE
+        self.crop_max_age: float = CROP_MAX_AGE
+        self.max_ages: dict[str, float] = {}
+        """Maximum ages of specific plant categories which override the weed and crop max age."""
 
         self.PLANTS_CHANGED: Event[[]] = Event()
         """The collection of plants has changed."""
 
+        self.PLANT_CHANGES: Event[PlantChanges] = Event()
+        """Plants have been added, updated or removed (argument: the ids of the affected plants)."""
+
+        self.CONFIDENCE_THRESHOLDS_CHANGED: Event[[]] = Event()
+        """The combined confidence thresholds which make plants relevant have changed."""
+
         self.ADDED_NEW_WEED: Event[Plant] = Event()
         """A new weed has been added."""
 
@@ -49,75 +153,234 @@ class PlantProvider(rosys.persistence.Persistable):
 
         rosys.on_repeat(self.prune, 10.0)
 
-    def prune(self) -> None:
-        weeds_max_age = 10.0
-        crops_max_age = 60.0 * 300.0
-        num_weeds_before = len(self.weeds)
-        num_crops_before = len(self.crops)
-        self.weeds[:] = [weed for weed in self.weeds if weed.detection_time > rosys.time() - weeds_max_age]
-        self.crops[:] = [crop for crop in self.crops if crop.detection_time > rosys.time() - crops_max_age]
-        self.log.debug('Pruned %s weeds and %s crops',
-                       num_weeds_before - len(self.weeds),
-                       num_crops_before - len(self.crops))
+    @property
+    def weeds(self) -> list[Plant]:
+        return list(self._weeds.values())
+
+    @property
+    def crops(self) -> list[Plant]:
+        return list(self._crops.values())
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Collect all changes within the context and emit them as a single change event at the end."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._emit_changes()
+
+    def _record(self) -> PlantChanges:
+        if self._changes is None:
+            self._changes = PlantChanges()
+        return self._changes
+
+    def _record_removal(self, plant_ids: Iterable[str]) -> None:
+        changes = self._record()
+        for plant_id in plant_ids:
+            changes.remove(plant_id)
+        self._emit_changes()
+
+    def _emit_changes(self) -> None:
+        if self._batch_depth > 0:
+            return
+        changes, self._changes = self._changes, None
+        if not changes:
+            return
+        self.version += 1
         self.PLANTS_CHANGED.emit()
+        self.PLANT_CHANGES.emit(changes)
+
+    def prune(self) -> None:
+        if self._expiry_settings != (self.weed_max_age, self.crop_max_age, self.max_ages):
+            self._reschedule_expiries()
+        now = rosys.time()
+        removed_weeds = self._remove(self._weeds, self._weed_grid,
+                                     self._weed_expiries.pop_expired(now, lambda plant_id: self._expiry_time(plant_id, is_weed=True)))
+        removed_crops = self._remove(self._crops, self._crop_grid,
+                                     self._crop_expiries.pop_expired(now, lambda plant_id: self._expiry_time(plant_id, is_weed=False)))
+        if not removed_weeds and not removed_crops:
+            return
+        self.log.debug('Pruned %s weeds and %s crops', len(removed_weeds), len(removed_crops))
+        self._record_removal(removed_weeds + removed_crops)
+
+    def max_age(self, plant: Plant, *, is_weed: bool) -> float:
+        return self.max_ages.get(plant.type, self.weed_max_age if is_weed else self.crop_max_age)
+
+    def _expiry_time(self, plant_id: str, *, is_weed: bool) -> float | None:
+        plant = (self._weeds if is_weed else self._crops).get(plant_id)
+        if plant is None:
+            return None
+        return plant.detection_time + self.max_age(plant, is_weed=is_weed)
+
+    def _reschedule_expiries(self) -> None:
+        self._expiry_settings = (self.weed_max_age, self.crop_max_age, dict(self.max_ages))
+        for plants, queue, is_weed in [(self._weeds, self._weed_expiries, True), (self._crops, self._crop_expiries, False)]:
+            queue.clear()
+            for plant in plants.values():
+                queue.push(plant.id, plant.detection_time + self.max_age(plant, is_weed=is_weed))
+
+    @staticmethod
+    def _remove(plants: dict[str, Plant], grid: PlantGrid, plant_ids: Iterable[str]) -> list[str]:
+        removed: list[str] = []
+        for plant_id in plant_ids:
+            if plants.pop(plant_id, None) is not None:
+                grid.remove(plant_id)
+                removed.append(plant_id)
+        return removed
 
     def get_plant_by_id(self, plant_id: str) -> Plant:
-        for plant in self.crops + self.weeds:
-            if plant.id == plant_id:
-                return plant
-        raise ValueError(f'Plant with ID {plant_id} not found')
+        plant = self._crops.get(plant_id) or self._weeds.get(plant_id)
+        if plant is None:
+            raise ValueError(f'Plant with ID {plant_id} not found')
+        return plant
 
     async def add_weed(self, weed: Plant) -> None:
-        if check_if_plant_exists(weed, self.weeds, 0.02):
-            return
-        self.weeds.append(weed)
-        self.PLANTS_CHANGED.emit()
-        self.ADDED_NEW_WEED.emit(weed)
+        await self.add_weeds([weed])
+
+    async def add_weeds(self, weeds: list[Plant]) -> None:
+        """Add the weeds of one detection frame, merging them with known weeds by optimal assignment."""
+        for weed in self._add_plants(weeds, WEED_MATCH_DISTANCE, is_weed=True):
+            self.ADDED_NEW_WEED.emit(weed)
 
     def remove_weed(self, weed_id: str) -> None:
-        num_weeds_before = len(self.weeds)
-        self.weeds[:] = [weed for weed in self.weeds if weed.id != weed_id]
-        if len(self.weeds) < num_weeds_before:
-            self.log.debug('Removed weed %s', weed_id[:8])
-            self.PLANTS_CHANGED.emit()
+        self.remove_weeds([weed_id])
+
+    def remove_weeds(self, weed_ids: Iterable[str]) -> None:
+        removed = self._remove(self._weeds, self._weed_grid, weed_ids)
+        if removed:
+            self.log.debug('Removed weeds %s', ', '.join(weed_id[:8] for weed_id in removed))
+            self._record_removal(removed)
 
     def clear_weeds(self) -> None:
-        self.log.debug('Clearing all %s weeds', len(self.weeds))
-        self.weeds.clear()
-        self.PLANTS_CHANGED.emit()
+        self.log.debug('Clearing all %s weeds', len(self._weeds))
+        removed = list(self._weeds)
+        self._weeds.clear()
+        self._weed_grid.clear()
+        self._weed_expiries.clear()
+        self._record_removal(removed)
 
     def add_crop(self, crop: Plant) -> None:
-        if check_if_plant_exists(crop, self.crops, self.match_distance):
-            return
-        self.crops.append(crop)
-        self.PLANTS_CHANGED.emit()
-        self.ADDED_NEW_CROP.emit(crop)
+        self.add_crops([crop])
+
+    def add_crops(self, crops: list[Plant]) -> None:
+        """Add the crops of one detection frame, merging them with known crops by optimal assignment."""
+        for crop in self._add_plants(crops, self.match_distance, is_weed=False):
+            self.ADDED_NEW_CROP.emit(crop)
+
+    def _add_plants(self, observations: list[Plant], max_distance: float, *, is_weed: bool) -> list[Plant]:
+        if not observations:
+            return []
+        plants, grid, expiries = (self._weeds, self._weed_grid, self._weed_expiries) if is_weed else \
+            (self._crops, self._crop_grid, self._crop_expiries)
+        xs = [o.position.x for o in observations]
+        ys = [o.position.y for o in observations]
+        center = Point3d(x=(min(xs) + max(xs)) / 2, y=(min(ys) + max(ys)) / 2, z=0)
+        radius = max(o.position.distance(center) for o in observations) + max_distance
+        candidates = grid.query(center, radius)
+        matches = dict(associate(observations, candidates, max_distance))
+        changes = self._record()
+        new_plants: list[Plant] = []
+        for i, observation in enumerate(observations):
+            if i in matches:
+                plant = candidates[matches[i]]
+                was_prior = plant.is_prior
+                merge_observation(plant, observation)
+                grid.update(plant)
+                if was_prior:
+                    changes.add(plant.id, is_weed=is_weed)
+                else:
+                    changes.update(plant.id)
+            else:
+                plants[observation.id] = observation
+                grid.add(observation)
+                expiries.push(observation.id, observation.detection_time + self.max_age(observation, is_weed=is_weed))
+                changes.add(observation.id, is_weed=is_weed)
+                new_plants.append(observation)
+        self._emit_changes()
+        return new_plants
+
+    def add_crop_priors(self, priors: list[Plant]) -> list[Plant]:
+        """Add remembered crops which are not tracked yet and return them.
+
+        Priors are not associated with known crops, so they can not confirm them.
+        They become regular crops with the first matching detection.
+        """
+        changes = self._record()
+        added: list[Plant] = []
+        for prior in priors:
+            if self._crop_grid.query(prior.position, self.match_distance):
+                continue
+            prior.is_prior = True
+            self._crops[prior.id] = prior
+            self._crop_grid.add(prior)
+            self._crop_expiries.push(prior.id, prior.detection_time + self.max_age(prior, is_weed=False))
+            changes.add_prior(prior.id)
+            added.append(prior)
+        self._emit_changes()
+        return added
 
     def remove_crop(self, crop_id: str) -> None:
-        num_crops_before = len(self.crops)
-        self.crops[:] = [c for c in self.crops if c.id != crop_id]
-        if len(self.crops) < num_crops_before:
-            self.log.debug('Removed crop %s', crop_id[:8])
-            self.PLANTS_CHANGED.emit()
+        self.remove_crops([crop_id])
+
+    def remove_crops(self, crop_ids: Iterable[str]) -> None:
+        removed = self._remove(self._crops, self._crop_grid, crop_ids)
+        if removed:
+            self.log.debug('Removed crops %s', ', '.join(crop_id[:8] for crop_id in removed))
+            self._record_removal(removed)
 
     def clear_crops(self) -> None:
-        self.log.debug('Clearing all %s crops', len(self.crops))
-        self.crops.clear()
-        self.PLANTS_CHANGED.emit()
+        self.log.debug('Clearing all %s crops', len(self._crops))
+        removed = list(self._crops)
+        self._crops.clear()
+        self._crop_grid.clear()
+        self._crop_expiries.clear()
+        self._record_removal(removed)
 
     def clear(self) -> None:
-        self.clear_weeds()
-        self.clear_crops()
+        with self.batch():
+            self.clear_weeds()
+            self.clear_crops()
+
+    def memory_report(self) -> dict[str, int]:
+        """Summarize the memory held by the detection images of the plant map."""
+        referenced = {plant.detection_image.image_id for plant in [*self._weeds.values(), *self._crops.values()]
+                      if plant.detection_image is not None}
+        return {
+            'stored_images': len(self.image_store),
+            'stored_bytes': self.image_store.bytes,
+            'referenced_images': len(referenced),
+            'referenced_bytes': self.image_store.resident_bytes(referenced),
+        }
 
     def get_relevant_crops(self, point: Point3d, *, max_distance=0.5, min_confidence: float | None = None) -> list[Plant]:
         if min_confidence is None:
             min_confidence = self.minimum_combined_crop_confidence
-        return [c for c in self.crops if c.position.distance(point) <= max_distance and c.confidence >= min_confidence]
+        return [c for c in self._crop_grid.query(point, max_distance) if c.confidence >= min_confidence]
+
+    def predict_crops(self, row_start: Point, row_end: Point, point: Point3d, *, max_distance: float = 0.5) -> list[Point]:
+        """Predict crop positions along the row around the point from the confirmed crops and the crop spacing."""
+        confirmed = [c.position.projection() for c in self.get_relevant_crops(point, max_distance=2 * max_distance)]
+        along = row_start.direction(row_end)
+        point_along = (point.x - row_start.x) * np.cos(along) + (point.y - row_start.y) * np.sin(along)
+        return predict_crop_positions(confirmed, row_start, row_end, self.crop_spacing,
+                                      start=point_along - max_distance, end=point_along + max_distance)
+
+    def get_predicted_crops(self, row_start: Point, row_end: Point, point: Point3d, *, max_distance: float = 0.5) -> list[Plant]:
+        """Return confirmed crops and crops with a lower confidence which are located where a crop is predicted."""
+        predictions = self.predict_crops(row_start, row_end, point, max_distance=max_distance)
+        return [c for c in self.get_relevant_crops(point, max_distance=max_distance,
+                                                   min_confidence=min(self.minimum_predicted_crop_confidence,
+                                                                      self.minimum_combined_crop_confidence))
+                if c.confidence >= self.minimum_combined_crop_confidence or
+                any(p.distance(c.position.projection()) < self.match_distance for p in predictions)]
 
     def get_relevant_weeds(self, point: Point3d, *, max_distance=0.5, min_confidence: float | None = None) -> list[Plant]:
         if min_confidence is None:
             min_confidence = self.minimum_combined_weed_confidence
-        return [w for w in self.weeds if w.position.distance(point) <= max_distance and w.confidence >= min_confidence]
+        return [w for w in self._weed_grid.query(point, max_distance) if w.confidence >= min_confidence]
 
     def backup_to_dict(self) -> dict[str, Any]:
         data = {
@@ -125,6 +388,10 @@ class PlantProvider(rosys.persistence.Persistable):
             'crop_spacing': self.crop_spacing,
             'minimum_combined_crop_confidence': self.minimum_combined_crop_confidence,
             'minimum_combined_weed_confidence': self.minimum_combined_weed_confidence,
+            'minimum_predicted_crop_confidence': self.minimum_predicted_crop_confidence,
+            'weed_max_age': self.weed_max_age,
+            'crop_max_age': self.crop_max_age,
+            'max_ages': self.max_ages,
         }
         return data
 
@@ -135,14 +402,25 @@ class PlantProvider(rosys.persistence.Persistable):
                                                          self.minimum_combined_crop_confidence)
         self.minimum_combined_weed_confidence = data.get('minimum_combined_weed_confidence',
                                                          self.minimum_combined_weed_confidence)
+        self.minimum_predicted_crop_confidence = data.get('minimum_predicted_crop_confidence',
+                                                          self.minimum_predicted_crop_confidence)
+        self.weed_max_age = data.get('weed_max_age', self.weed_max_age)
+        self.crop_max_age = data.get('crop_max_age', self.crop_max_age)
+        self.max_ages = data.get('max_ages', self.max_ages)
+
+    def _handle_thresholds_changed(self) -> None:
+        self.request_backup()
+        self.CONFIDENCE_THRESHOLDS_CHANGED.emit()
 
     def settings_ui(self) -> None:
-        ui.number('Combined crop confidence threshold', step=0.05, min=0.05, max=5.00, format='%.2f', on_change=self.request_backup) \
+        ui.number('Combined crop confidence threshold', step=0.05, min=0.05, max=5.00, format='%.2f',
+                  on_change=self._handle_thresholds_changed) \
             .props('dense outlined') \
             .classes('w-24') \
             .bind_value(self, 'minimum_combined_crop_confidence') \
             .tooltip(f'Needed crop confidence for punching (default: {MINIMUM_COMBINED_CROP_CONFIDENCE:.2f})')
-        ui.number('Combined weed confidence threshold', step=0.05, min=0.05, max=5.00, format='%.2f', on_change=self.request_backup) \
+        ui.number('Combined weed confidence threshold', step=0.05, min=0.05, max=5.00, format='%.2f',
+                  on_change=self._handle_thresholds_changed) \
             .props('dense outlined') \
             .classes('w-24') \
             .bind_value(self, 'minimum_combined_weed_confidence') \
@@ -157,3 +435,19 @@ class PlantProvider(rosys.persistence.Persistable):
             .classes('w-24') \
             .bind_value(self, 'crop_spacing') \
             .tooltip(f'Spacing between crops needed for crop position prediction (default: {CROP_SPACING:.2f})')
+        ui.number('Predicted crop confidence threshold', step=0.05, min=0.05, max=5.00, format='%.2f', on_change=self.request_backup) \
+            .props('dense outlined') \
+            .classes('w-24') \
+            .bind_value(self, 'minimum_predicted_crop_confidence') \
+            .tooltip('Needed crop confidence for punching if the crop is where the crop spacing predicts one '
+                     f'(default: {MINIMUM_PREDICTED_CROP_CONFIDENCE:.2f})')
+        ui.number('Weed max. age', step=1.0, min=1.0, format='%.0f', on_change=self.request_backup) \
+            .props('dense outlined suffix=s') \
+            .classes('w-24') \
+            .bind_value(self, 'weed_max_age') \
+            .tooltip(f'Time after which weeds which have not been detected again are forgotten (default: {WEED_MAX_AGE:.0f}s)')
+        ui.number('Crop max. age', step=60.0, min=1.0, format='%.0f', on_change=self.request_backup) \
+            .props('dense outlined suffix=s') \
+            .classes('w-24') \
+            .bind_value(self, 'crop_max_age') \
+            .tooltip(f'Time after which crops which have not been detected again are forgotten (default: {CROP_MAX_AGE:.0f}s)')
@@ -10,6 +10,9 @@ from rosys.geometry import Point
 
 from ..hardware import Axis, ChainAxis, FieldFriend, Tornado
 
+Y_POSITION_TOLERANCE = 0.0005
+TORNADO_STANDSTILL_TIMEOUT = 2.0
+
 
 class PuncherException(Exception):
     pass
@@ -17,8 +20,8 @@ class PuncherException(Exception):
 
 class Puncher:
     def __init__(self, field_friend: FieldFriend, driver: Driver) -> None:
-        self.PUNCHED: Event[[]] = Event()
-        """A punch has been performed."""
+        self.PUNCHED: Event[Point] = Event()
+        """A punch has been performed (argument: the punched world position)."""
 
         self.punch_allowed: str = 'waiting'
         self.field_friend = field_friend
@@ -72,6 +75,7 @@ class Puncher:
                     turns: float = 2.0,
                     with_open_tornado: bool = False,
                     ) -> None:
+        position = self.driver.prediction.transform(Point(x=self.field_friend.WORK_X, y=y))
         y += self.field_friend.WORK_Y
         y = round(y, 5)
         self.log.debug('Punching at %.5f with depth %.2f...', y, depth)
@@ -98,12 +102,14 @@ class Puncher:
 
             if isinstance(self.field_friend.z_axis, Tornado):
                 assert isinstance(self.field_friend.y_axis, Axis)
-                await rosys.run.retry(lambda y=y: self.field_friend.y_axis.move_to(y),  # type: ignore
-                                      on_failed=self.field_friend.y_axis.recover)
+                if not self._is_y_axis_at(y):
+                    await rosys.run.retry(lambda y=y: self.field_friend.y_axis.move_to(y),  # type: ignore
+                                          on_failed=self.field_friend.y_axis.recover)
                 await self.tornado_drill(angle=angle, depth=depth, turns=turns, with_open_drill=with_open_tornado)
 
             elif isinstance(self.field_friend.z_axis, Axis):
-                await self.field_friend.y_axis.move_to(y)
+                if not self._is_y_axis_at(y):
+                    await self.field_friend.y_axis.move_to(y)
                 await self.field_friend.z_axis.move_to(-0.05 if self.is_demo else -depth)
                 if os.environ.get('Z_AXIS_REST_POSITION'):
                     target = float(os.environ.get('Z_AXIS_REST_POSITION', '0'))
@@ -112,13 +118,18 @@ class Puncher:
                 else:
                     await self.field_friend.z_axis.return_to_reference()
             self.log.debug('punched at %.2f with depth %.2f, now back to rest position "%s"', y, depth, rest_position)
-            self.PUNCHED.emit()
+            self.PUNCHED.emit(position)
         except Exception as e:
             raise PuncherException('punching failed') from e
         finally:
             await self.field_friend.y_axis.stop()
             await self.field_friend.z_axis.stop()
 
+    def _is_y_axis_at(self, y: float) -> bool:
+        """Whether the y-axis has already been moved to the position, e.g. while approaching the target."""
+        assert self.field_friend.y_axis is not None
+        return abs(self.field_friend.y_axis.position - y) < Y_POSITION_TOLERANCE
+
     @track
     @uninterruptible
     async def clear_view(self) -> None:
@@ -171,31 +182,46 @@ class Puncher:
                 if not success:
                     raise PuncherException('homing failed')
                 await rosys.sleep(0.5)
-            await self.field_friend.z_axis.move_down_until_reference(min_position=-0.058 if self.is_demo else None)
-            # TODO: find out why this sleep is needed
-            await rosys.sleep(2.0)
-            if depth != 0.0 and not self.is_demo:
-                await self.field_friend.z_axis.move_to(min(self.field_friend.z_axis.position_z + depth, 0))
-
-            await self.field_friend.z_axis.turn_knifes_to(corrected_angle)
-            await rosys.sleep(0.2)
-            await self.field_friend.z_axis.turn_by(turns)
-            await rosys.sleep(0.2)
-
+            await self._lower_tornado(depth)
+            await self._cut_with_tornado(corrected_angle, turns)
             if with_open_drill and angle > 0:
                 self.log.debug('Drilling again with open drill...')
-                await self.field_friend.z_axis.turn_knifes_to(0)
-                await rosys.sleep(0.2)
-                await self.field_friend.z_axis.turn_by(turns)
-                await rosys.sleep(0.2)
-
-            await self.field_friend.z_axis.return_to_reference()
-            await rosys.sleep(0.2)
-            await self.field_friend.z_axis.turn_knifes_to(0)
-            await rosys.sleep(0.2)
+                await self._cut_with_tornado(0, turns)
+            await self._raise_tornado()
         except Exception as e:
             raise PuncherException(f'tornado drill failed because of: {e}') from e
         finally:
             if self.field_friend.y_axis:
                 await self.field_friend.y_axis.stop()
             await self.field_friend.z_axis.stop()
+
+    @track
+    async def _lower_tornado(self, depth: float) -> None:
+        assert isinstance(self.field_friend.z_axis, Tornado)
+        await self.field_friend.z_axis.move_down_until_reference(min_position=-0.058 if self.is_demo else None)
+        if self.field_friend.z_axis.ref_knife_stop:
+            raise PuncherException('knife stop triggered while lowering')
+        await self._wait_for_tornado_standstill('lowering')
+        if depth != 0.0 and not self.is_demo:
+            await self.field_friend.z_axis.move_to(min(self.field_friend.z_axis.position_z + depth, 0))
+
+    @track
+    async def _cut_with_tornado(self, angle: float, turns: float) -> None:
+        assert isinstance(self.field_friend.z_axis, Tornado)
+        await self.field_friend.z_axis.turn_knifes_to(angle)
+        await self._wait_for_tornado_standstill('turning the knifes')
+        await self.field_friend.z_axis.turn_by(turns)
+        await self._wait_for_tornado_standstill('cutting')
+
+    @track
+    async def _raise_tornado(self) -> None:
+        assert isinstance(self.field_friend.z_axis, Tornado)
+        await self.field_friend.z_axis.return_to_reference()
+        await self._wait_for_tornado_standstill('raising')
+        await self.field_friend.z_axis.turn_knifes_to(0)
+        await self._wait_for_tornado_standstill('closing the knifes')
+
+    async def _wait_for_tornado_standstill(self, phase: str) -> None:
+        assert isinstance(self.field_friend.z_axis, Tornado)
+        if not await self.field_friend.z_axis.wait_for_standstill(timeout=TORNADO_STANDSTILL_TIMEOUT):
+            self.log.warning('Tornado did not stand still after %s within %.1f s', phase, TORNADO_STANDSTILL_TIMEOUT)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+import rosys
+from rosys.event import Event
+
+if TYPE_CHECKING:
+    from ..system import System
+
+POLL_INTERVAL = 0.05
+CAMERA_EXPOSURE_TIME = 3.0
+AXES_TIMEOUT = 2.0
+
+log = logging.getLogger('field_friend.readiness')
+
+
+class ReadinessGate:
+    """Condition a component has to satisfy before an implement starts working.
+
+    The gate is started when the component is switched on and is ready once the warm-up time has passed and the condition holds.
+    Starting an already started gate keeps its start time, so a component which stays switched on is ready right away on resume.
+    A gate which is not ``required`` only logs a warning if it is not ready in time.
+    """
+
+    def __init__(self, name: str, condition: Callable[[], bool] | None = None, *,
+                 warmup: float = 0.0, timeout: float = 5.0, required: bool = True) -> None:
+        self.READY: Event[[]] = Event()
+        """The gate has become ready."""
+
+        self.name = name
+        self.condition = condition
+        self.warmup = warmup
+        self.timeout = timeout
+        self.required = required
+        self.start_time: float | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        if self.start_time is None or rosys.time() - self.start_time < self.warmup:
+            return False
+        return self.condition is None or self.condition()
+
+    def start(self) -> None:
+        if self.start_time is None:
+            self.start_time = rosys.time()
+
+    def reset(self) -> None:
+        self.start_time = None
+
+    async def wait(self) -> bool:
+        """Wait until the gate is ready and return whether it was within the warm-up time plus the timeout."""
+        t = rosys.time()
+        self.start()
+        assert self.start_time is not None
+        deadline = max(self.start_time + self.warmup, t) + self.timeout
+        while not self.is_ready:
+            if rosys.time() > deadline:
+                log.warning('%s not ready after %.2f s', self.name, rosys.time() - t)
+                return False
+            await rosys.sleep(POLL_INTERVAL)
+        log.info('%s ready after %.2f s', self.name, rosys.time() - t)
+        self.READY.emit()
+        return True
+
+
+async def wait_until_ready(*gates: ReadinessGate) -> bool:
+    """Wait for all gates concurrently and return whether all required ones became ready."""
+    t = rosys.time()
+    results = await asyncio.gather(*(gate.wait() for gate in gates))
+    log.info('%s ready after %.2f s', ', '.join(gate.name for gate in gates), rosys.time() - t)
+    for gate, result in zip(gates, results, strict=True):
+        if not result and not gate.required:
+            log.warning('Continuing although %s is not ready', gate.name)
+    return all(result or not gate.required for gate, result in zip(gates, results, strict=True))
+
+
+class Readiness:
+    """Readiness gates of the hardware components shared by all implements."""
+
+    def __init__(self, system: System) -> None:
+        self.field_friend = system.field_friend
+        self.camera_provider = system.camera_provider
+        self.flashlight = ReadinessGate('flashlight', self._is_flashlight_ready)
+        self.camera = ReadinessGate('camera exposure', self._has_new_image, warmup=CAMERA_EXPOSURE_TIME)
+        self.axes = ReadinessGate('axes', self._are_axes_ready, timeout=AXES_TIMEOUT)
+
+    def _is_flashlight_ready(self) -> bool:
+        flashlight = self.field_friend.flashlight
+        return flashlight is None or not isinstance(flashlight, rosys.hardware.ModuleHardware) or flashlight.robot_brain.is_ready
+
+    def _has_new_image(self) -> bool:
+        """Check if a connected camera has captured an image after the exposure has settled."""
+        if self.camera_provider is None or self.camera.start_time is None:
+            return False
+        camera = self.camera_provider.first_connected_camera
+        image = camera.latest_captured_image if camera is not None else None
+        return image is not None and image.time >= self.camera.start_time + self.camera.warmup
+
+    def _are_axes_ready(self) -> bool:
+        return all(axis is None or (axis.is_referenced and not getattr(axis, 'alarm', False))
+                   for axis in (self.field_friend.y_axis, self.field_friend.z_axis))
+
+    async def turn_on_flashlight(self) -> None:
+        """Turn on the flashlight and let the camera adjust its exposure unless the light was on already."""
+        if self.field_friend.flashlight:
+            await self.field_friend.flashlight.turn_on()
+        if self.flashlight.start_time is None:
+            self.flashlight.start()
+            self.camera.reset()
+        self.camera.start()
+
+    async def turn_off_flashlight(self) -> None:
+        if self.field_friend.flashlight:
+            await self.field_friend.flashlight.turn_off()
+        self.flashlight.reset()
+        self.camera.reset()
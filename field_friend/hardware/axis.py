@@ -79,6 +79,10 @@ class Axis(rosys.hardware.Module, abc.ABC):
     def position(self) -> float:
         return self.compute_position(self.steps)
 
+    def travel_time(self, position: float) -> float:
+        """Estimated time to move from the current to the given position at maximum speed."""
+        return abs(position - self.position) * self.steps_per_m / self.max_speed
+
     async def return_to_reference(self) -> None:
         try:
             await self.move_to(0)
@@ -62,20 +62,25 @@ class FieldFriend(rosys.hardware.Robot):
 
         The point is given in local coordinates, i.e. the origin is the center of the tool.
         """
-        if not self.implement_name:
-            raise NotImplementedError('This robot has no tool to reach with.')
+        min_y, max_y = self.reachable_y_range(second_tool=second_tool)
         if add_work_offset:
             local_point.x += self.WORK_X
             local_point.y += self.WORK_Y
+        return min_y <= local_point.y <= max_y
+
+    def reachable_y_range(self, *, second_tool: bool = False) -> tuple[float, float]:
+        """Lateral range in robot coordinates which is reachable by the tool."""
+        if not self.implement_name:
+            raise NotImplementedError('This robot has no tool to reach with.')
         if self.implement_name in ['weed_screw', 'tornado'] and isinstance(self.y_axis, Axis):
-            return self.y_axis.min_position <= local_point.y <= self.y_axis.max_position
+            return self.y_axis.min_position, self.y_axis.max_position
         if self.implement_name in ['dual_mechanism'] and isinstance(self.y_axis, ChainAxis):
             if second_tool:
-                return self.y_axis.MIN_POSITION <= local_point.y <= self.y_axis.MAX_POSITION
-            return self.y_axis.min_position <= local_point.y <= self.y_axis.max_position
+                return self.y_axis.MIN_POSITION, self.y_axis.MAX_POSITION
+            return self.y_axis.min_position, self.y_axis.max_position
         if self.implement_name in ['sprayer']:
             assert isinstance(self.z_axis, Sprayer)
-            return abs(local_point.y) <= self.z_axis.spray_radius
+            return -self.z_axis.spray_radius, self.z_axis.spray_radius
         raise NotImplementedError(f'Tool {self.implement_name} is not implemented for reachability check')
 
     def tornado_diameters(self, angle: float) -> tuple:
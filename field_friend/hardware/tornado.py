@@ -9,6 +9,10 @@ from rosys.helpers import remove_indentation
 
 from ..config import TornadoConfiguration
 
+STANDSTILL_INTERVAL = 0.1
+Z_STANDSTILL_TOLERANCE = 0.0005
+TURN_STANDSTILL_TOLERANCE = 1.0
+
 
 class Tornado(rosys.hardware.Module, abc.ABC):
     """Controls the vertical axis of the Tornado weeding implement."""
@@ -86,6 +90,18 @@ class Tornado(rosys.hardware.Module, abc.ABC):
         self.is_referenced = True
         return True
 
+    async def wait_for_standstill(self, *, timeout: float = 2.0) -> bool:
+        """Wait until the z and turn positions do not change anymore and return whether they did within the timeout."""
+        deadline = rosys.time() + timeout
+        position_z, position_turn = self.position_z, self.position_turn
+        while rosys.time() < deadline:
+            await rosys.sleep(STANDSTILL_INTERVAL)
+            if abs(self.position_z - position_z) < Z_STANDSTILL_TOLERANCE and \
+                    abs(self.position_turn - position_turn) < TURN_STANDSTILL_TOLERANCE:
+                return True
+            position_z, position_turn = self.position_z, self.position_turn
+        return False
+
     async def return_to_reference(self) -> bool:
         try:
             if not self.is_referenced:
@@ -352,7 +352,6 @@ class CameraCard:
         svg = ''
         for i, plant_id in enumerate(plants_to_handle.keys()):
             try:
-                # TODO: inefficient
                 plant = self.plant_provider.get_plant_by_id(plant_id)
             except ValueError:
                 continue
@@ -4,6 +4,9 @@ from typing import TYPE_CHECKING
 import rosys
 from nicegui.elements.scene_objects import Group, Sphere
 
+from ...automations import Plant
+from ...automations.plant_provider import PlantChanges
+
 if TYPE_CHECKING:
     from ...system import System
 
@@ -16,26 +19,64 @@ class PlantObjects(Group):
         self.plant_provider = system.plant_provider
         self.plant_locator = system.plant_locator
         self.log = logging.getLogger('field_friend.plant_objects')
+        self._spheres: dict[str, Sphere] = {}
+        self._thresholds = self._confidence_thresholds()
         self.update()
-        self.plant_provider.PLANTS_CHANGED.register_ui(self.update)
+        self.plant_provider.PLANT_CHANGES.register_ui(self.apply_changes)
+        self.plant_provider.CONFIDENCE_THRESHOLDS_CHANGED.register_ui(self.update)
 
     def update(self) -> None:
+        """Synchronize the scene objects with all relevant plants."""
+        self._thresholds = self._confidence_thresholds()
         origin = rosys.geometry.Point3d(x=0, y=0, z=0)
         in_world = {p.id: p for p in
                     self.plant_provider.get_relevant_weeds(origin, max_distance=1000) +
                     self.plant_provider.get_relevant_crops(origin, max_distance=1000)}
-        rendered = {o.name.split(':')[1]: o for o in self.scene.objects.values()
-                    if o.name and o.name.startswith('plant_')}
-        for id_, obj in rendered.items():
-            if id_ not in in_world:
-                obj.delete()
+        for id_ in [id_ for id_ in self._spheres if id_ not in in_world]:
+            self._delete(id_)
         for id_, plant in in_world.items():
-            if id_ not in rendered:
-                if plant.type in self.plant_locator.weed_category_names:
-                    Sphere(0.02).with_name(f'plant_{plant.type}:{id_}') \
-                        .material('#ef1208') \
-                        .move(plant.position.x, plant.position.y, 0.02)
-                else:
-                    Sphere(0.035).with_name(f'plant_{plant.type}:{id_}') \
-                        .material('#11ede3') \
-                        .move(plant.position.x, plant.position.y, 0.035)
+            if id_ not in self._spheres:
+                self._create(plant)
+
+    def apply_changes(self, changes: PlantChanges) -> None:
+        """Only touch the scene objects of plants which have been added, updated or removed."""
+        if self._confidence_thresholds() != self._thresholds:
+            self.update()
+            return
+        for id_ in changes.removed:
+            self._delete(id_)
+        for id_ in changes.added_weeds | changes.added_crops | changes.updated:
+            try:
+                plant = self.plant_provider.get_plant_by_id(id_)
+            except ValueError:
+                continue
+            sphere = self._spheres.get(id_)
+            if not self._is_relevant(plant):
+                self._delete(id_)
+            elif sphere is None:
+                self._create(plant)
+            else:
+                sphere.move(plant.position.x, plant.position.y, sphere.z)
+
+    def _confidence_thresholds(self) -> tuple[float, float]:
+        return self.plant_provider.minimum_combined_weed_confidence, self.plant_provider.minimum_combined_crop_confidence
+
+    def _is_relevant(self, plant: Plant) -> bool:
+        if plant.type in self.plant_locator.weed_category_names:
+            return plant.confidence >= self.plant_provider.minimum_combined_weed_confidence
+        return plant.confidence >= self.plant_provider.minimum_combined_crop_confidence
+
+    def _create(self, plant: Plant) -> None:
+        if plant.type in self.plant_locator.weed_category_names:
+            self._spheres[plant.id] = Sphere(0.02).with_name(f'plant_{plant.type}:{plant.id}') \
+                .material('#ef1208') \
+                .move(plant.position.x, plant.position.y, 0.02)
+        else:
+            self._spheres[plant.id] = Sphere(0.035).with_name(f'plant_{plant.type}:{plant.id}') \
+                .material('#11ede3') \
+                .move(plant.position.x, plant.position.y, 0.035)
+
+    def _delete(self, plant_id: str) -> None:
+        sphere = self._spheres.pop(plant_id, None)
+        if sphere is not None:
+            sphere.delete()
@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING, cast
 import rosys
 from nicegui import ui
 
+from ...automations.implements import WeedingImplement
 from ...hardware import Axis, ChainAxis, FieldFriendHardware, FlashlightPWMHardware, FlashlightPWMHardwareV2, Tornado
 
 if TYPE_CHECKING:
@@ -106,6 +107,15 @@ def create_status_drawer(system: System) -> ui.right_drawer:
         with ui.row().classes('place-items-center'):
             ui.label('Distance driven').style('color: #6E93D6').classes('font-bold')
             kpi_distance = ui.label()
+        with ui.row().classes('place-items-center'):
+            ui.label('Weeding stops').style('color: #6E93D6').classes('font-bold')
+            kpi_weeding_stops = ui.label()
+        with ui.row().classes('place-items-center'):
+            ui.label('Treated area').style('color: #6E93D6').classes('font-bold')
+            kpi_treated_area = ui.label()
+        with ui.row().classes('place-items-center'):
+            ui.label('Punch cycle').style('color: #6E93D6').classes('font-bold')
+            punch_cycle_label = ui.label()
 
         def update_status() -> None:
             if isinstance(robot.y_axis, ChainAxis):
@@ -173,6 +183,12 @@ def create_status_drawer(system: System) -> ui.right_drawer:
             kpi_time_charging.text = f'{system.kpi_provider.get_time_as_string(system.kpi_provider.all_time_kpis.time_charging)}'
             distance = system.kpi_provider.all_time_kpis.distance
             kpi_distance.text = f'{distance:3.0f} m' if distance < 1000 else f'{(distance/1000):6.3f} km'
+            kpis = system.kpi_provider.all_time_kpis
+            kpi_weeding_stops.text = f'{kpis.weeds_per_stop:.1f} weeds/stop, {kpis.stops_per_meter:.2f} stops/m'
+            kpi_treated_area.text = f'{kpis.treated_area:.2f} m², {kpis.double_treatment_ratio * 100:.0f}% treated twice'
+            implement = system.current_implement
+            punch_cycle_label.text = f'{implement.average_punch_cycle_duration:.2f} s' \
+                if isinstance(implement, WeedingImplement) and implement.punch_cycle_durations else '-'
 
         ui.timer(rosys.config.ui_update_interval, update_status)
     return status_drawer
@@ -94,6 +94,8 @@ class DevPage:
             if self.system.plant_locator is not None:
                 with ui.card():
                     self.system.plant_locator.developer_ui()
+                with ui.card():
+                    self.system.detection_recorder.developer_ui()
             if isinstance(self.system.circle_sight_detector, DetectorHardware):
                 with ui.card():
                     ui.label('Circle Sight Detector').classes('text-center text-bold')
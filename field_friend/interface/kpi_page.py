@@ -22,7 +22,9 @@ class KpiPage(kpi_page):
         positives = KpiChart(title='Weeding Statistics', indicators={
             'weeds_detected': 'Weeds detected',
             'crops_detected': 'Crops detected',
-            'punches': 'Punches'
+            'punches': 'Punches',
+            'weeding_stops': 'Weeding stops',
+            'weeds_removed': 'Weeds removed',
         })
         # TODO: not working, because only incidents are counted, not the values
         # time = KpiChart(title='Working Time', unit='Seconds', indicators={
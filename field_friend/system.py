@@ -9,12 +9,24 @@ import psutil
 import rosys
 from rosys.driving import Driver, Odometer, Steerer
 from rosys.event import Event
-from rosys.geometry import GeoPoint, GeoReference
+from rosys.geometry import GeoPoint, GeoReference, Point
 from rosys.hardware.gnss import GnssHardware, GnssSimulation
 
 from .app_controls import AppControls as app_controls
-from .automations import AutomationWatcher, FieldProvider, KpiProvider, PlantLocator, PlantProvider, Puncher
-from .automations.implements import Implement, Recorder, Tornado, WeedingScrew, WeedingSprayer
+from .automations import (
+    AutomationWatcher,
+    CoverageMap,
+    CropMap,
+    DetectionRecorder,
+    FieldProvider,
+    KpiProvider,
+    PlantLocator,
+    PlantProvider,
+    Puncher,
+    Readiness,
+)
+from .automations.coverage_map import COVERAGE_MAP_PATH, CoverageChange
+from .automations.implements import Implement, Recorder, Tornado, WeedingImplement, WeedingScrew, WeedingSprayer
 from .automations.navigation import FieldNavigation, ImplementDemoNavigation, StraightLineNavigation, WaypointNavigation
 from .capture import Capture
 from .config import get_config
@@ -94,10 +106,16 @@ class System(rosys.persistence.Persistable):
             notify=False,
         )
         self.plant_provider = PlantProvider().persistent()
+        self.crop_map = CropMap(self.plant_provider)
         self.plant_locator: PlantLocator = PlantLocator(self).persistent()
+        self.detection_recorder = DetectionRecorder(self)
         self.puncher: Puncher = Puncher(self.field_friend, self.driver)
+        self.readiness = Readiness(self)
         self.field_provider: FieldProvider = FieldProvider().persistent()
         self.field_provider.FIELD_SELECTED.register(self.update_gnss_reference_from_field)
+        # NOTE: tests reuse the same field id, so the coverage of previous runs must not be restored
+        self.coverage_map = CoverageMap(self.field_provider, path=None if rosys.is_test else COVERAGE_MAP_PATH)
+        self.puncher.PUNCHED.register(self._record_punch)
         self.automation_watcher: AutomationWatcher = AutomationWatcher(self)
 
         self.setup_timelapse()
@@ -210,6 +228,19 @@ class System(rosys.persistence.Persistable):
             case _:
                 raise NotImplementedError(f'Unknown implement: {self.field_friend.implement_name}')
         self.implements = {t.name: t for t in implements}
+        for implement in implements:
+            if isinstance(implement, WeedingImplement):
+                implement.WEEDS_HANDLED.register(self._count_weeding_stop)
+
+    def _record_punch(self, position: Point) -> None:
+        if not isinstance(self.current_implement, WeedingImplement):
+            return
+        inner_radius, radius = self.current_implement.treatment_footprint()
+        self.coverage_map.record(position, radius, inner_radius=inner_radius)
+
+    def _count_weeding_stop(self, weeds_removed: int) -> None:
+        self.kpi_provider.increment_all_time_kpi('weeding_stops', 1)
+        self.kpi_provider.count_all_time_kpi('weeds_removed', weeds_removed)
 
     def setup_navigations(self) -> None:
         first_implement = next(iter(self.implements.values()))
@@ -257,6 +288,12 @@ class System(rosys.persistence.Persistable):
         rosys.NEW_NOTIFICATION.register(self.timelapse_recorder.notify)
         rosys.on_startup(self.timelapse_recorder.compress_video)  # NOTE: cleanup JPEGs from before last shutdown
 
+    def _count_treated_area(self, change: CoverageChange) -> None:
+        if change.treated_area:
+            self.kpi_provider.increment_all_time_kpi('treated_area', change.treated_area)
+        if change.double_treated_area:
+            self.kpi_provider.increment_all_time_kpi('double_treated_area', change.double_treated_area)
+
     def setup_kpi(self) -> None:
         last_update = rosys.time()
         last_position = self.robot_locator.pose
@@ -275,12 +312,13 @@ class System(rosys.persistence.Persistable):
                 .register(lambda: self.kpi_provider.increment_all_time_kpi('automation_completed', 1))
 
         if self.plant_provider:
-            self.plant_provider.ADDED_NEW_WEED \
-                .register(lambda _: self.kpi_provider.increment_all_time_kpi('weeds_detected', 1))
-            self.plant_provider.ADDED_NEW_CROP \
-                .register(lambda _: self.kpi_provider.increment_all_time_kpi('crops_detected', 1))
+            self.plant_provider.PLANT_CHANGES \
+                .register(lambda changes: self.kpi_provider.count_all_time_kpi('weeds_detected', len(changes.added_weeds)))
+            self.plant_provider.PLANT_CHANGES \
+                .register(lambda changes: self.kpi_provider.count_all_time_kpi('crops_detected', len(changes.added_crops)))
         if self.puncher:
-            self.puncher.PUNCHED.register(lambda: self.kpi_provider.increment_all_time_kpi('punches', 1))
+            self.puncher.PUNCHED.register(lambda _: self.kpi_provider.increment_all_time_kpi('punches', 1))
+        self.coverage_map.TREATED.register(self._count_treated_area)
         if self.field_friend.bumper:
             self.field_friend.bumper.BUMPER_TRIGGERED \
                 .register(lambda _: self.kpi_provider.increment_all_time_kpi('bumps', 1))
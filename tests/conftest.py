@@ -1,13 +1,15 @@
+import itertools
 import logging
 from collections.abc import AsyncGenerator, Generator
 
+import numpy as np
 import pytest
 import rosys
-from rosys.geometry import GeoPoint, GeoPose, GeoReference, Pose
+from rosys.geometry import GeoPoint, GeoPose, GeoReference, Point3d, Pose
 from rosys.hardware import GnssSimulation, ImuSimulation, WheelsSimulation
 from rosys.testing import forward, helpers
 
-from field_friend.automations import Field, Row
+from field_friend.automations import Field, Plant, Row
 from field_friend.hardware.double_wheels import WheelsSimulationWithAcceleration
 from field_friend.interface.components.field_creator import FieldCreator
 from field_friend.system import System
@@ -247,6 +249,26 @@ def gnss_driving(system: System) -> Generator[System, None, None]:
     yield system
 
 
+@pytest.fixture
+async def dense_weed_clusters(system: System) -> AsyncGenerator[System, None]:
+    """Crops along a row in front of the robot, each surrounded by a dense grid of weeds"""
+    # NOTE: the grid spacing is slightly larger than the weed match distance so that the weeds are not merged
+    offsets = np.linspace(-0.084, 0.084, 9)
+    for crop_x in (0.15, 0.33):
+        crop = Plant(type='maize', detection_time=rosys.time())
+        for _ in range(3):
+            crop.add_observation(Point3d(x=crop_x, y=0, z=0), 0.9)
+        system.plant_provider.add_crop(crop)
+        weeds: list[Plant] = []
+        for dx, dy in itertools.product(offsets.tolist(), repeat=2):
+            weed = Plant(type='weed', detection_time=rosys.time())
+            for _ in range(3):
+                weed.add_observation(Point3d(x=crop_x + dx, y=dy, z=0), 0.9)
+            weeds.append(weed)
+        await system.plant_provider.add_weeds(weeds)
+    yield system
+
+
 @pytest.fixture
 def detector(system: System) -> Generator[rosys.vision.DetectorSimulation, None, None]:
     assert isinstance(system.detector, rosys.vision.DetectorSimulation)
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+import rosys
+from rosys.geometry import Point
+from rosys.testing import forward
+
+from field_friend import System
+from field_friend.automations import CoverageMap, Field
+from field_friend.automations.implements import WeedingScrew
+
+
+def test_recording_treatments(system: System):
+    coverage_map = CoverageMap(system.field_provider, path=None)
+    change = coverage_map.record(Point(x=1.0, y=0.5), 0.025)
+    assert change.treated_area > 0
+    assert change.double_treated_area == 0
+    assert coverage_map.is_treated(Point(x=1.0, y=0.5))
+    assert not coverage_map.is_treated(Point(x=1.05, y=0.5))
+    assert coverage_map.are_treated(np.array([[1.0, 0.5], [1.05, 0.5], [-3.0, 2.0]])).tolist() == [True, False, False]
+
+    change = coverage_map.record(Point(x=1.01, y=0.5), 0.025)
+    assert 0 < change.double_treated_area < coverage_map.statistics().treated_area
+
+
+def test_treating_a_ring(system: System):
+    coverage_map = CoverageMap(system.field_provider, path=None)
+    coverage_map.record(Point(x=0, y=0), 0.08, inner_radius=0.03)
+    assert not coverage_map.is_treated(Point(x=0, y=0))
+    assert coverage_map.is_treated(Point(x=0.05, y=0))
+
+
+def test_persisting_coverage_per_field(system: System, field: Field, tmp_path: Path):
+    coverage_map = CoverageMap(system.field_provider, path=tmp_path)
+    system.field_provider.select_field(field.id)
+    coverage_map.record(Point(x=2.0, y=-1.0), 0.025)
+    coverage_map.save()
+    assert list((tmp_path / field.id).glob('*.npy'))
+
+    restored = CoverageMap(system.field_provider, path=tmp_path)
+    assert not restored.is_treated(Point(x=2.0, y=-1.0)), 'earlier runs should not prevent treating the ground again'
+    assert restored.statistics() == coverage_map.statistics()
+
+
+def test_starting_a_new_run(system: System):
+    coverage_map = CoverageMap(system.field_provider, path=None)
+    coverage_map.record(Point(x=1.0, y=0.5), 0.025)
+    statistics = coverage_map.statistics()
+    coverage_map.start_run()
+    assert not coverage_map.is_treated(Point(x=1.0, y=0.5))
+    assert not coverage_map.are_treated(np.array([[1.0, 0.5]])).any()
+    assert coverage_map.statistics() == statistics
+
+    change = coverage_map.record(Point(x=1.0, y=0.5), 0.025)
+    assert change.double_treated_area > 0
+    assert coverage_map.is_treated(Point(x=1.0, y=0.5))
+
+
+async def test_weeding_records_coverage(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=rosys.geometry.Point3d(x=0.2, y=0.05, z=0)))
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    system.automator.start()
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped)
+    assert not detector.simulated_objects
+    assert system.coverage_map.is_treated(Point(x=0.2, y=0.05))
+    assert system.kpi_provider.all_time_kpis.treated_area > 0
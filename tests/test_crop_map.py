@@ -0,0 +1,55 @@
+import math
+from pathlib import Path
+
+import rosys
+from rosys.geometry import Point3d
+from rosys.testing import assert_point
+
+from field_friend import System
+from field_friend.automations import CropMap, Field, Plant
+from field_friend.automations.plant_provider import PlantChanges
+
+
+async def test_crop_map_round_trip(system: System, field: Field, tmp_path: Path):
+    crop_map = CropMap(system.plant_provider, path=tmp_path)
+    real_field = system.field_provider.get_field(field.id)
+    assert real_field is not None
+    row = real_field.rows[0]
+    start = row.points[0].to_local()
+    end = row.points[-1].to_local()
+    on_row = start.interpolate(end, 0.5)
+    for point in [on_row, on_row.polar(real_field.row_spacing, start.direction(end) + math.pi / 2)]:
+        crop = Plant(type='sugar_beet', detection_time=rosys.time())
+        for _ in range(3):
+            crop.add_observation(Point3d(x=point.x, y=point.y, z=0), 0.9)
+        system.plant_provider.add_crop(crop)
+    crop_map.save_row(real_field, row)
+    assert crop_map.row_path(real_field, row).exists()
+
+    tracked = {crop.id: crop.confidence for crop in system.plant_provider.crops}
+    assert crop_map.load_row(real_field, row) == [], 'crops which are still tracked should not be loaded again'
+    assert {crop.id: crop.confidence for crop in system.plant_provider.crops} == tracked
+
+    system.plant_provider.clear()
+    changes: list[PlantChanges] = []
+    system.plant_provider.PLANT_CHANGES.register(changes.append)
+    crops = crop_map.load_row(real_field, row)
+    assert len(crops) == 1, 'only crops along the row should be stored'
+    assert crops[0].type == 'sugar_beet'
+    assert crops[0].is_prior
+    assert_point(crops[0].position, Point3d(x=on_row.x, y=on_row.y, z=0))
+    assert len(system.plant_provider.crops) == 1
+    assert crops[0].confidence < system.plant_provider.minimum_combined_crop_confidence
+    assert not system.plant_provider.get_relevant_crops(crops[0].position), 'remembered crops need to be detected again'
+    assert changes[-1].added_priors == {crops[0].id}
+    assert not changes[-1].added_crops, 'remembered crops should not count as detected'
+
+    for _ in range(2):
+        redetected = Plant(type='sugar_beet', detection_time=rosys.time())
+        redetected.add_observation(Point3d(x=on_row.x + 0.01, y=on_row.y, z=0), 0.5)
+        system.plant_provider.add_crop(redetected)
+    assert len(system.plant_provider.crops) == 1
+    assert not crops[0].is_prior
+    assert list(crops[0].confidences) == [0.5, 0.5], 'the prior should not be part of the observations'
+    assert changes[-2].added_crops == {crops[0].id}, 'the first detection of a remembered crop counts as detected'
+    assert system.plant_provider.get_relevant_crops(crops[0].position) == [crops[0]]
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import rosys
+from rosys.geometry import Point3d
+from rosys.testing import forward
+
+from field_friend import System
+from field_friend.automations import DetectionReplay
+from field_friend.automations.detection_log import LoggedCalibration, LoggedFrame, read_detection_log
+
+
+async def test_recording_and_replaying_detections(system: System, detector: rosys.vision.DetectorSimulation,
+                                                  tmp_path: Path):
+    for i in range(3):
+        detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                       position=Point3d(x=0.2 + i * 0.05, y=0.03, z=0)))
+    path = tmp_path / 'detections.ffdlog'
+    system.detection_recorder.start(path)
+    system.plant_locator.resume()
+    await forward(2)
+    system.plant_locator.pause()
+    system.detection_recorder.stop()
+    recorded_weeds = len(system.plant_provider.weeds)
+    assert recorded_weeds == 3
+
+    records = list(read_detection_log(path))
+    assert isinstance(records[0], LoggedCalibration)
+    frames = [r for r in records if isinstance(r, LoggedFrame)]
+    assert frames
+    assert all(d.category_name == 'weed' for frame in frames for d in frame.detections)
+
+    system.plant_provider.clear()
+    pose = system.robot_locator.pose
+    replay = DetectionReplay(system)
+    report = await replay.run(path)
+    assert report.frames == len(frames)
+    assert report.detections == sum(len(frame.detections) for frame in frames)
+    assert report.new_plants == recorded_weeds
+    assert len(replay.plant_provider.weeds) == recorded_weeds
+    assert not system.plant_provider.weeds
+    assert system.robot_locator.pose.distance(pose) == 0
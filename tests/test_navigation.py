@@ -178,3 +178,19 @@ async def test_skip_first_segment(system: System):
     assert system.current_navigation.current_segment.end.x == pytest.approx(pose3.x, abs=0.1)
     assert system.current_navigation.current_segment.end.y == pytest.approx(pose3.y, abs=0.1)
     assert system.current_navigation.current_segment.end.yaw_deg == pytest.approx(pose3.yaw_deg, abs=0.1)
+
+
+@pytest.mark.parametrize('end', (Pose(x=10.0, y=0.0, yaw=0.0), Pose(x=1.5, y=1.5, yaw=np.pi / 2)))
+def test_arc_length_table(end: Pose):
+    segment = DriveSegment.from_poses(Pose(x=0.0, y=0.0, yaw=0.0), end)
+    table = segment.arc_length
+    assert segment.arc_length is table
+    assert table.length == pytest.approx(segment.spline.estimated_length(steps=1000), abs=1e-4)
+    for t in (0.1, 0.5, 0.9):
+        assert table.t_at(table.distance_at(t)) == pytest.approx(t)
+        advanced = segment.spline.pose(table.advance_by(t, 0.2))
+        assert table.distance_at(table.closest_t(advanced.point)) - table.distance_at(t) == pytest.approx(0.2, abs=1e-4)
+    for point in (Point(x=-1.0, y=0.3), Point(x=0.7, y=0.4), Point(x=12.0, y=-0.5)):
+        for t_min, t_max in ((0.0, 1.0), (-0.2, 1.2)):
+            expected = segment.spline.closest_point(point.x, point.y, t_min=t_min, t_max=t_max)
+            assert table.closest_t(point, t_min=t_min, t_max=t_max) == pytest.approx(expected, abs=1e-3)
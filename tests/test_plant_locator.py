@@ -0,0 +1,101 @@
+import logging
+import time
+
+import pytest
+import rosys
+from rosys.geometry import Point
+from rosys.testing import forward
+
+from field_friend import System
+
+log = logging.getLogger('field_friend.testing')
+
+
+async def test_projecting_dense_detections_at_once(system: System, detector: rosys.vision.DetectorSimulation):
+    # pylint: disable=protected-access
+    for i in range(16):
+        for j in range(16):
+            detector.simulated_objects.append(rosys.vision.SimulatedObject(
+                category_name='weed', position=rosys.geometry.Point3d(x=0.33 + i * 0.008, y=-0.06 + j * 0.008, z=0)))
+    system.plant_locator.resume()
+    await forward(2)
+    assert system.camera_provider is not None
+    camera = next(iter(system.camera_provider.cameras.values()))
+    assert isinstance(camera, rosys.vision.CalibratableCamera)
+    assert camera.calibration is not None
+    image = camera.latest_detected_image
+    assert image is not None
+    assert image.detections is not None
+    assert len(image.detections.points) >= 200
+
+    t = time.perf_counter()
+    weeds, crops = system.plant_locator._plants_from_image(camera, image, system.robot_locator.pose)
+    log.info('Projecting %s detections took %.1f ms', len(image.detections.points), (time.perf_counter() - t) * 1000)
+    assert len(weeds) >= 200
+    assert not crops
+    expected = [camera.calibration.project_from_image(Point(x=d.cx, y=d.cy)) for d in image.detections.points]
+    for weed in weeds:
+        assert any(point is not None and weed.position.distance(point) < 1e-9 for point in expected)
+
+
+async def test_locating_plants_with_multiple_detections_in_flight(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.detection_delay = 0.5
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=rosys.geometry.Point3d(x=0.4, y=0.0, z=0)))
+    system.plant_locator.max_detections_in_flight = 3
+    system.plant_locator.resume()
+    await forward(3.2)
+    assert len(system.plant_provider.weeds) == 1
+    assert len(system.plant_provider.weeds[0].positions) > 3.0 / detector.detection_delay, \
+        'pipelined detection should handle more frames than one per detector round trip'
+
+
+async def test_projecting_detections_relative_to_capture_pose(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.detection_delay = 0.5
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=rosys.geometry.Point3d(x=0.55, y=0.0, z=0)))
+    system.plant_locator.max_detections_in_flight = 3
+    system.plant_locator.resume()
+    await system.field_friend.wheels.drive(0.2, 0)
+    await forward(1.0)
+    await system.field_friend.wheels.stop()
+    assert len(system.plant_provider.weeds) == 1
+    # NOTE: projecting with the pose at arrival time would shift the weed by the distance driven during the detection delay
+    assert system.plant_provider.weeds[0].position.x == pytest.approx(0.55, abs=0.03)
+
+
+async def test_detection_stats_per_camera(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=rosys.geometry.Point3d(x=0.4, y=0.0, z=0)))
+    system.plant_locator.resume()
+    await forward(3)
+    assert system.camera_provider is not None
+    assert set(system.plant_locator.detection_stats) == set(system.camera_provider.cameras)
+    stats = next(iter(system.plant_locator.detection_stats.values()))
+    assert stats.frames > 0
+    assert stats.rate > 0
+
+
+async def test_paused_locator_does_not_poll(system: System):
+    system.plant_locator.resume()
+    await forward(2)
+    system.plant_locator.pause()
+    stats = next(iter(system.plant_locator.detection_stats.values()))
+    wakeups = stats.wakeups
+    await forward(5)
+    assert stats.wakeups - wakeups < 5 / system.plant_locator.INTERVAL / 10, 'the locator should wait for new images'
+
+
+async def test_stopping_detection_loops_while_paused(system: System):
+    # pylint: disable=protected-access
+    system.plant_locator.resume()
+    await forward(1)
+    tasks = list(system.plant_locator._camera_tasks.values())
+    assert tasks
+    system.plant_locator.pause()
+    await forward(0.1)
+    assert all(task.done() for task in tasks)
+    system.plant_locator.resume()
+    await forward(0.1)
+    assert system.plant_locator._camera_tasks
+    assert not any(task.done() for task in system.plant_locator._camera_tasks.values())
@@ -1,6 +1,15 @@
+import logging
+import time
+
+import pytest
 import rosys
 
 from field_friend.automations import Plant, PlantProvider
+from field_friend.automations.image_store import ImageStore
+from field_friend.automations.plant import MAX_HISTORY
+from field_friend.automations.plant_provider import PlantChanges
+
+log = logging.getLogger('field_friend.testing')
 
 
 def test_extracting_relevant_crops():
@@ -16,10 +25,206 @@ def test_extracting_relevant_crops():
     assert len(crops) == 8, 'crops with a confidence of less than PlantProvider.MINIMUM_COMBINED_CROP_CONFIDENCE should be ignored'
 
 
+def test_querying_many_plants():
+    plants = PlantProvider()
+    for i in range(2_500):
+        plants.add_crop(create_crop(i // 50 * 0.1, i % 50 * 0.1))
+    assert len(plants.crops) == 2_500
+    for x, y, expected in [(2.5, 2.5, 9), (0.0, 0.0, 4), (4.9, 2.0, 6), (2.55, 2.55, 4), (10.0, 10.0, 0)]:
+        point = rosys.geometry.Point3d(x=x, y=y, z=0)
+        crops = plants.get_relevant_crops(point, max_distance=0.15)
+        assert len(crops) == expected
+        assert {c.id for c in crops} == {c.id for c in plants.crops if c.position.distance(point) <= 0.15}
+
+
+def test_adding_detections_to_many_plants():
+    def add_detections() -> float:
+        """Merge a frame of 20 detections into the plants of row 1 and return the time per detection."""
+        frame = [create_crop(0.1 + 0.005, i * 0.1) for i in range(100, 120)]
+        t = time.perf_counter()
+        plants.add_crops(frame)
+        return (time.perf_counter() - t) / len(frame)
+
+    plants = PlantProvider()
+    rows, plants_per_row = 250, 400
+    few_plants_duration = 0.0
+    for row in range(rows):
+        plants.add_crops([create_crop(row * 0.1, i * 0.1) for i in range(plants_per_row)])
+        if row == 2:
+            few_plants_duration = min(add_detections() for _ in range(20))
+    many_plants_duration = min(add_detections() for _ in range(20))
+    log.info('Adding a detection took %.1f µs with %s plants and %.1f µs with %s plants',
+             few_plants_duration * 1e6, 3 * plants_per_row, many_plants_duration * 1e6, rows * plants_per_row)
+    assert len(plants.crops) == rows * plants_per_row
+    crops = plants.get_relevant_crops(rosys.geometry.Point3d(x=0.1, y=11.0, z=0), max_distance=0.05)
+    assert len(crops) == 1
+    assert list(crops[0].confidences) == [0.9] * MAX_HISTORY, 'each frame should have been merged into the existing plants'
+    assert crops[0].position.x == pytest.approx(0.1 + 0.005)
+
+
+def test_plant_aggregates_follow_evicted_entries():
+    plant = Plant(type='maize', detection_time=rosys.time())
+    for i in range(50):
+        plant.add_observation(rosys.geometry.Point3d(x=i, y=-i, z=0), 0.1 * i)
+    assert len(plant.positions) == 20
+    assert plant.position.x == pytest.approx(sum(range(30, 50)) / 20)
+    assert plant.position.y == pytest.approx(-sum(range(30, 50)) / 20)
+    assert plant.confidence == pytest.approx(0.1 * sum(range(30, 50)))
+    plant.confidences.clear()
+    plant.confidences.append(0.4)
+    assert plant.confidence == pytest.approx(0.4)
+
+
+def test_plant_aggregates_follow_direct_changes_of_full_histories():
+    plant = Plant(type='maize', detection_time=rosys.time())
+    for i in range(20):
+        plant.add_observation(rosys.geometry.Point3d(x=i, y=0, z=0), 0.1)
+    assert plant.confidence == pytest.approx(2.0)
+    plant.confidences.append(1.1)
+    plant.positions.append(rosys.geometry.Point3d(x=40, y=0, z=0))
+    assert len(plant.confidences) == 20
+    assert plant.confidence == pytest.approx(3.0)
+    assert plant.position.x == pytest.approx(sum(range(1, 20), 40) / 20)
+    plant.confidences[0] = 0.2
+    assert plant.confidence == pytest.approx(3.1)
+
+
+async def test_removing_weeds_in_bulk():
+    plants = PlantProvider()
+    weeds = [create_crop(i / 10.0, 0) for i in range(10)]
+    for weed in weeds:
+        await plants.add_weed(weed)
+    events: list[None] = []
+    plants.PLANTS_CHANGED.register(lambda: events.append(None))
+    plants.remove_weeds([w.id for w in weeds[2:8]] + ['unknown'])
+    assert [w.id for w in plants.weeds] == [w.id for w in weeds[:2] + weeds[8:]]
+    assert len(events) == 1
+    assert plants.get_plant_by_id(weeds[9].id) is weeds[9]
+    with pytest.raises(ValueError):
+        plants.get_plant_by_id(weeds[5].id)
+    assert not plants.get_relevant_weeds(rosys.geometry.Point3d(x=0.5, y=0, z=0), max_distance=0.15)
+
+
+async def test_emitting_one_change_event_per_batch():
+    plants = PlantProvider()
+    existing = create_crop(0.0, 0.0)
+    plants.add_crop(existing)
+    changes: list[PlantChanges] = []
+    plants.PLANT_CHANGES.register(changes.append)
+    new_weeds = [create_crop(i / 10.0, 0) for i in range(5)]
+    with plants.batch():
+        for weed in new_weeds:
+            await plants.add_weed(weed)
+        plants.add_crop(create_crop(0.0, 0.0))
+        plants.remove_weed(new_weeds[0].id)
+    assert len(changes) == 1
+    assert changes[0].added_weeds == {w.id for w in new_weeds[1:]}
+    assert changes[0].updated == {existing.id}
+    assert not changes[0].added_crops
+    assert not changes[0].removed
+
+
+async def test_associating_dense_weeds_optimally():
+    plants = PlantProvider()
+    await plants.add_weeds([create_crop(0.0, 0.0), create_crop(0.03, 0.0)])
+    first, second = plants.weeds
+    # NOTE: greedy matching would merge both observations into the first weed
+    await plants.add_weeds([create_crop(0.015, 0.0), create_crop(-0.01, 0.0)])
+    assert len(plants.weeds) == 2
+    assert len(first.positions) == 4
+    assert len(second.positions) == 4
+
+
+async def test_associating_hundreds_of_detections_per_frame():
+    plants = PlantProvider()
+    await plants.add_weeds([create_crop(i // 20 * 0.05, i % 20 * 0.05) for i in range(400)])
+    assert len(plants.weeds) == 400
+    frame = [create_crop(i // 20 * 0.05 + 0.005, i % 20 * 0.05 - 0.005) for i in range(400)]
+    t = time.perf_counter()
+    await plants.add_weeds(frame)
+    log.info('Associating 400 detections took %.1f ms', (time.perf_counter() - t) * 1000)
+    assert len(plants.weeds) == 400
+    for i, weed in enumerate(plants.weeds):
+        assert len(weed.positions) == 4
+        assert weed.position.x == pytest.approx(i // 20 * 0.05 + 0.005 / 4)
+        assert weed.position.y == pytest.approx(i % 20 * 0.05 - 0.005 / 4)
+
+
+async def test_pruning_expired_plants():
+    plants = PlantProvider()
+    plants.max_ages = {'sugar_beet': 1.0}
+    now = rosys.time()
+    old_weed = create_crop(0.0, 0.0)
+    old_weed.detection_time = now - 20.0
+    redetected_weed = create_crop(1.0, 0.0)
+    redetected_weed.detection_time = now - 20.0
+    await plants.add_weeds([old_weed, redetected_weed, create_crop(2.0, 0.0)])
+    old_beet = create_crop(0.0, 0.0)
+    old_beet.type = 'sugar_beet'
+    old_beet.detection_time = now - 2.0
+    plants.add_crops([old_beet, create_crop(1.0, 0.0)])
+    await plants.add_weed(create_crop(1.0, 0.0))
+    changes: list[PlantChanges] = []
+    plants.PLANT_CHANGES.register(changes.append)
+
+    plants.prune()
+    assert changes[0].removed == {old_weed.id, old_beet.id}
+    assert len(plants.weeds) == 2
+    assert len(plants.crops) == 1
+
+    plants.prune()
+    assert len(changes) == 1, 'pruning without expired plants should not emit a change'
+
+
+def test_image_store_keeps_byte_budget():
+    store = ImageStore(byte_budget=3_000)
+    images = [rosys.vision.Image(camera_id='cam', size=rosys.vision.ImageSize(width=10, height=10), time=i, data=b'x' * 1_000)
+              for i in range(5)]
+    references = [store.add(image) for image in images[:3]]
+    assert store.get(references[0]) is images[0]
+    store.add(images[3])
+    assert store.bytes == 3_000
+    assert store.get(references[1]) is None, 'the least recently used image should be evicted'
+    assert store.get(references[0]) is images[0]
+
+    plants = PlantProvider()
+    plants.image_store = store
+    crop = create_crop(0, 0)
+    crop.detection_image = references[0]
+    plants.add_crop(crop)
+    report = plants.memory_report()
+    assert report['referenced_images'] == 1
+    assert report['referenced_bytes'] == 1_000
+    assert report['stored_bytes'] == 3_000
+
+
+def test_predicting_crops_from_spacing():
+    plants = PlantProvider()
+    plants.crop_spacing = 0.2
+    for x in [0.05, 0.25, 0.45]:
+        plants.add_crop(create_crop(x, 0.02))
+    row_start = rosys.geometry.Point(x=0, y=0)
+    row_end = rosys.geometry.Point(x=10, y=0)
+    predictions = plants.predict_crops(row_start, row_end, rosys.geometry.Point3d(x=0.5, y=0, z=0))
+    assert [round(p.x, 3) for p in predictions] == [0.05, 0.25, 0.45, 0.65, 0.85]
+    assert all(p.y == pytest.approx(0.02) for p in predictions)
+
+    uncertain_crop = create_crop(0.65, 0.02)
+    uncertain_crop.confidences.clear()
+    uncertain_crop.confidences.append(0.5)
+    misplaced_crop = create_crop(0.75, 0.02)
+    misplaced_crop.confidences.clear()
+    misplaced_crop.confidences.append(0.5)
+    plants.add_crops([uncertain_crop, misplaced_crop])
+    crops = plants.get_predicted_crops(row_start, row_end, rosys.geometry.Point3d(x=0.5, y=0, z=0))
+    assert uncertain_crop in crops
+    assert misplaced_crop not in crops
+    assert uncertain_crop not in plants.get_relevant_crops(rosys.geometry.Point3d(x=0.5, y=0, z=0))
+
+
 def create_crop(x: float, y: float) -> Plant:
     """Creates a maize plant with three observed positions at the given coordinates."""
     plant = Plant(type='maize', detection_time=rosys.time())
     for _ in range(3):
-        plant.positions.append(rosys.geometry.Point3d(x=x, y=y, z=0))
-        plant.confidences.append(0.9)
+        plant.add_observation(rosys.geometry.Point3d(x=x, y=y, z=0), 0.9)
     return plant
@@ -0,0 +1,80 @@
+import asyncio
+
+import rosys
+from rosys.geometry import Point3d
+from rosys.testing import forward
+
+from field_friend import System
+from field_friend.automations import ReadinessGate
+from field_friend.automations.readiness import wait_until_ready
+
+
+async def test_waiting_for_gates_concurrently(system: System):
+    gates = [ReadinessGate(f'gate {i}', warmup=1.0) for i in range(3)]
+    ready: list[str] = []
+    for gate in gates:
+        gate.READY.register(lambda gate=gate: ready.append(gate.name))
+    t = rosys.time()
+    task = asyncio.create_task(wait_until_ready(*gates))
+    await forward(until=task.done)
+    assert task.result()
+    assert rosys.time() - t < 1.5
+    assert len(ready) == 3
+
+
+async def test_gate_stays_ready_while_started(system: System):
+    gate = ReadinessGate('gate', warmup=1.0)
+    gate.start()
+    await forward(1.1)
+    t = rosys.time()
+    assert await wait_until_ready(gate)
+    assert rosys.time() - t < 0.1
+    gate.reset()
+    assert not gate.is_ready
+
+
+async def test_gate_timeout(system: System):
+    gate = ReadinessGate('gate', lambda: False, timeout=0.5)
+    task = asyncio.create_task(gate.wait())
+    await forward(until=task.done)
+    assert not task.result()
+
+
+async def test_plant_locator_is_ready_after_first_detection(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=Point3d(x=0.2, y=0.0, z=0)))
+    system.plant_locator.resume()
+    assert not system.plant_locator.readiness.is_ready
+    task = asyncio.create_task(system.plant_locator.readiness.wait())
+    await forward(until=task.done)
+    assert task.result()
+
+
+async def test_camera_is_ready_after_new_image(system: System):
+    assert system.camera_provider is not None
+    camera = system.camera_provider.first_connected_camera
+    assert camera is not None
+    await forward(1)
+    assert camera.latest_captured_image is not None
+    gate = system.readiness.camera
+    gate.reset()
+    gate.start()
+    assert not gate.is_ready, 'images captured before the gate was started do not count'
+    await forward(gate.warmup / 2)
+    assert not gate.is_ready, 'the exposure needs time to settle'
+    task = asyncio.create_task(gate.wait())
+    await forward(until=task.done)
+    assert task.result()
+    image = camera.latest_captured_image
+    assert image is not None
+    assert gate.start_time is not None
+    assert image.time >= gate.start_time + gate.warmup
+
+
+async def test_continuing_without_optional_gate(system: System):
+    required = ReadinessGate('required', timeout=0.5)
+    optional = ReadinessGate('optional', lambda: False, timeout=0.5, required=False)
+    task = asyncio.create_task(wait_until_ready(required, optional))
+    await forward(until=task.done)
+    assert task.result()
+    assert not optional.is_ready
@@ -1,12 +1,19 @@
+import logging
+import time
+
 import pytest
 import rosys
-from rosys.geometry import Pose
-from rosys.testing import forward
+from rosys.geometry import Point, Point3d, Pose
+from rosys.testing import assert_point, forward
 
 from field_friend import System
-from field_friend.automations.implements import Tornado, WeedingScrew
+from field_friend.automations import Plant
+from field_friend.automations.implements import Tornado, WeedingScrew, WeedingSprayer
+from field_friend.automations.implements.weeding_sprayer import plan_spray_windows
 from field_friend.automations.navigation import DriveSegment, StraightLineNavigation
 
+log = logging.getLogger('field_friend.testing')
+
 
 async def test_working_with_weeding_screw(system: System, detector: rosys.vision.DetectorSimulation):
     detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='maize',
@@ -24,6 +31,125 @@ async def test_working_with_weeding_screw(system: System, detector: rosys.vision
     assert detector.simulated_objects[0].category_name == 'maize'
 
 
+async def test_punching_multiple_weeds_per_stop(system: System, detector: rosys.vision.DetectorSimulation):
+    for y in (-0.08, 0.0, 0.05):
+        detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                       position=rosys.geometry.Point3d(x=0.3, y=y, z=0)))
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    system.current_implement.multi_target = True
+    stops: list[int] = []
+    system.current_implement.WEEDS_HANDLED.register(stops.append)
+    system.automator.start()
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped)
+    assert not detector.simulated_objects
+    assert len(stops) == 1, 'all weeds should be punched at a single stop'
+
+
+async def test_weeding_while_driving(system_with_acceleration: System):
+    system = system_with_acceleration
+    assert isinstance(system.detector, rosys.vision.DetectorSimulation)
+    for x, y in [(0.4, 0.02), (0.7, -0.05), (1.0, 0.04)]:
+        system.detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                              position=rosys.geometry.Point3d(x=x, y=y, z=0)))
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    system.current_implement.drive_while_weeding = True
+    speeds: list[float] = []
+    system.current_implement.WEEDS_HANDLED.register(
+        lambda _: speeds.append(system.odometer.current_velocity.linear if system.odometer.current_velocity else 0.0))
+    system.automator.start()
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped)
+    assert not system.detector.simulated_objects
+    assert len(speeds) == 3
+    assert all(speed > 0 for speed in speeds), 'the robot should not stop at the weeds'
+
+
+async def test_finishing_punch_at_the_end_of_the_segment(system_with_acceleration: System):
+    system = system_with_acceleration
+    assert isinstance(system.detector, rosys.vision.DetectorSimulation)
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    weed_x = system.current_navigation.length + system.field_friend.WORK_X - 0.02
+    system.detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                          position=rosys.geometry.Point3d(x=weed_x, y=0.0, z=0)))
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    system.current_implement.drive_while_weeding = True
+    punches: list[Point] = []
+    system.puncher.PUNCHED.register(punches.append)
+    system.automator.start()
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped)
+    assert not system.current_implement.is_working
+    assert len(punches) == 1, 'the punch should not be aborted when the segment ends'
+    assert not system.detector.simulated_objects
+
+
+async def test_prepositioning_y_axis_while_approaching(system: System, detector: rosys.vision.DetectorSimulation):
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    average_cycle_durations: list[float] = []
+    for preposition_y_axis in (False, True):
+        start_x = system.robot_locator.pose.x
+        for i, y in enumerate((0.06, -0.06, 0.06)):
+            detector.simulated_objects.append(rosys.vision.SimulatedObject(
+                category_name='weed', position=rosys.geometry.Point3d(x=start_x + 0.3 + i * 0.5, y=y, z=0)))
+        system.current_implement.preposition_y_axis = preposition_y_axis
+        system.current_implement.punch_cycle_durations.clear()
+        system.automator.start()
+        await forward(until=lambda: system.automator.is_running)
+        await forward(until=lambda: system.automator.is_stopped)
+        assert not detector.simulated_objects
+        assert len(system.current_implement.punch_cycle_durations) == 3
+        average_cycle_durations.append(system.current_implement.average_punch_cycle_duration)
+    log.info('Average punch cycle without and with pre-positioning: %.2f s, %.2f s', *average_cycle_durations)
+    assert average_cycle_durations[1] < average_cycle_durations[0]
+
+
+def test_merging_spray_windows():
+    weeds = {'a': 0.5, 'b': 0.1, 'c': 0.2, 'd': -0.05, 'e': -0.2}
+    windows = plan_spray_windows(weeds, radius=0.1, min_gap=0.01)
+    assert [(window.start, window.end) for window in windows] == [(0.0, pytest.approx(0.3)), (pytest.approx(0.4), pytest.approx(0.6))]
+    assert [window.weed_ids for window in windows] == [['d', 'b', 'c'], ['a']]
+    windows = plan_spray_windows(weeds, radius=0.1, min_gap=0.15)
+    assert [window.weed_ids for window in windows] == [['d', 'b', 'c', 'a']]
+
+
+@pytest.mark.parametrize('system', ['f21'], indirect=True)
+async def test_spraying_weeds_on_the_fly(system: System, detector: rosys.vision.DetectorSimulation):
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    system.current_implement = system.implements['Sprayer']
+    assert isinstance(system.current_implement, WeedingSprayer)
+    system.current_implement.pressure_reach_time = 1.0
+    handled: list[tuple[int, float]] = []
+    system.current_implement.WEEDS_HANDLED.register(lambda count: handled.append(
+        (count, system.odometer.current_velocity.linear if system.odometer.current_velocity else 0.0)))
+    weeds_per_minute: list[float] = []
+    for drive_while_weeding in (False, True):
+        start_x = system.robot_locator.pose.x
+        for i, y in enumerate((0.0, 0.05, -0.05, 0.0, 0.08, -0.03)):
+            detector.simulated_objects.append(rosys.vision.SimulatedObject(
+                category_name='weed', position=rosys.geometry.Point3d(x=start_x + 0.3 + i * 0.15, y=y, z=0)))
+        system.current_implement.drive_while_weeding = drive_while_weeding
+        handled.clear()
+        t = rosys.time()
+        system.automator.start()
+        await forward(until=lambda: system.automator.is_running)
+        await forward(until=lambda: system.automator.is_stopped)
+        assert not detector.simulated_objects
+        assert sum(count for count, _ in handled) == 6
+        if drive_while_weeding:
+            assert all(speed > 0 for _, speed in handled), 'the robot should not stop to spray'
+        weeds_per_minute.append(6 / (rosys.time() - t) * 60)
+    log.info('Sprayed weeds per minute when stopping and on the fly: %.1f, %.1f', *weeds_per_minute)
+    assert weeds_per_minute[1] > weeds_per_minute[0]
+
+
 async def test_keep_crops_safe(system: System, detector: rosys.vision.DetectorSimulation):
     detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='maize',
                                                                    position=rosys.geometry.Point3d(x=0.2, y=0.0, z=0)))
@@ -128,6 +254,86 @@ async def test_advance_when_target_behind_robot(system: System, detector: rosys.
     assert len(detector.simulated_objects) == 1
 
 
+async def test_intercepting_stops_waiting_when_the_robot_stands_still(system: System):
+    implement = system.implements['Weed Screw']
+    assert isinstance(implement, WeedingScrew)
+    handled: list[int] = []
+    implement.WEEDS_HANDLED.register(handled.append)
+    start_time = rosys.time()
+    system.automator.start(implement.intercept(Point(x=0.5, y=0.0)))
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped, timeout=10)
+    assert rosys.time() - start_time >= implement.STANDSTILL_TIMEOUT
+    assert not implement.is_intercepting
+    assert not handled
+
+
+async def test_weeding_screw_targets_nearest_unpunched_weed(system: System):
+    system.current_implement = system.implements['Weed Screw']
+    assert isinstance(system.current_implement, WeedingScrew)
+    weeds: list[Plant] = []
+    for x, y in [(0.3, 0.0), (0.2, 0.05), (0.25, 0.5), (0.15, 0.0)]:
+        weed = Plant(type='weed', detection_time=rosys.time())
+        for _ in range(3):
+            weed.add_observation(Point3d(x=x, y=y, z=0), 0.9)
+        weeds.append(weed)
+    await system.plant_provider.add_weeds(weeds)
+    assert len(system.plant_provider.weeds) == 4
+    system.coverage_map.record(Point(x=0.15, y=0.0), system.field_friend.DRILL_RADIUS)
+    target = await system.current_implement.get_target()
+    assert target is not None
+    # NOTE: the nearest weed was already punched and the one at y=0.5 is out of reach
+    assert_point(target, Point(x=0.2, y=0.05))
+    assert system.current_implement.next_punch_y_position == pytest.approx(0.05)
+
+
+def test_pushing_dense_weed_clusters_away_from_crops(dense_weed_clusters: System):
+    system = dense_weed_clusters
+    implement = system.implements['Weed Screw']
+    assert isinstance(implement, WeedingScrew)
+    cycles = 20
+    t = time.perf_counter()
+    for _ in range(cycles):
+        implement.clear()
+        implement.has_plants_to_handle()
+    duration = (time.perf_counter() - t) / cycles
+    log.info('handling %s weeds and %s crops took %.1f ms per cycle',
+             len(implement.weeds_to_handle), len(implement.crops_to_handle), duration * 1000)
+    assert len(implement.crops_to_handle) == 2
+    assert len(implement.weeds_to_handle) >= 100
+    safe_distance = system.field_friend.DRILL_RADIUS + implement.crop_safety_distance
+    for weed_position in implement.weeds_to_handle.values():
+        assert all(weed_position.distance(crop_position) >= safe_distance - 1e-9
+                   for crop_position in implement.crops_to_handle.values())
+
+
+async def test_reusing_plants_to_handle_within_a_cycle(dense_weed_clusters: System):
+    system = dense_weed_clusters
+    implement = system.implements['Weed Screw']
+    assert isinstance(implement, WeedingScrew)
+    implement.has_plants_to_handle()
+    weeds_to_handle = implement.weeds_to_handle
+    assert len(weeds_to_handle) >= 100
+    implement.has_plants_to_handle()
+    assert implement.weeds_to_handle is weeds_to_handle, 'plants should not be recomputed without pose or plant updates'
+
+    system.plant_provider.remove_weeds(list(weeds_to_handle)[:10])
+    implement.has_plants_to_handle()
+    assert len(implement.weeds_to_handle) == len(weeds_to_handle) - 10
+
+    weeds_to_handle = implement.weeds_to_handle
+    version = system.plant_provider.version
+    weed = Plant(type='weed', detection_time=rosys.time())
+    for _ in range(3):
+        weed.add_observation(Point3d(x=0.25, y=0.15, z=0), 0.9)
+    await system.plant_provider.add_weeds([weed])
+    assert system.plant_provider.version > version
+    implement.has_plants_to_handle()
+    assert implement.weeds_to_handle is not weeds_to_handle
+    assert weed.id in implement.weeds_to_handle
+    assert len(implement.weeds_to_handle) == len(weeds_to_handle) + 1
+
+
 @pytest.mark.parametrize('system', ['u4'], indirect=True)
 async def test_tornado_removes_weeds_around_crop(system: System, detector: rosys.vision.DetectorSimulation):
     assert isinstance(system.implements['Tornado'], Tornado)
@@ -189,6 +395,23 @@ async def test_tornado_drill_with_open_tornado(system: System, detector: rosys.v
         assert target not in detector.simulated_objects, f'target {target.position} should be removed'
 
 
+@pytest.mark.parametrize('system', ['u4'], indirect=True)
+async def test_tornado_punch_cycle_without_dead_time(system: System, detector: rosys.vision.DetectorSimulation):
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='sugar_beet',
+                                                                   position=rosys.geometry.Point3d(x=0.2, y=0.0, z=0)))
+    detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='weed',
+                                                                   position=rosys.geometry.Point3d(x=0.2, y=0.05, z=0)))
+    assert isinstance(system.current_navigation, StraightLineNavigation)
+    system.current_implement = system.implements['Tornado']
+    assert isinstance(system.current_implement, Tornado)
+    system.automator.start()
+    await forward(until=lambda: system.automator.is_running)
+    await forward(until=lambda: system.automator.is_stopped)
+    assert len(system.current_implement.punch_cycle_durations) == 1
+    # NOTE: fixed sleeps used to add about 4 s per crop
+    assert system.current_implement.punch_cycle_durations[0] < 1.5
+
+
 @pytest.mark.parametrize('system', ['u4'], indirect=True)
 async def test_tornado_skips_crop_if_no_weeds(system: System, detector: rosys.vision.DetectorSimulation):
     detector.simulated_objects.append(rosys.vision.SimulatedObject(category_name='sugar_beet',